@@ -0,0 +1,114 @@
+from time import perf_counter
+
+from gridstate import Contradiction, unknown, white, black
+
+
+class SearchStats:
+  # Counters for one backtracking search.
+  __slots__ = ('status', 'nodes', 'backtracks', 'max_depth', 'elapsed', 'solutions')
+
+  def __init__(self):
+    self.status = None    # 'solved', 'unsolvable' or 'budget'
+    self.solutions = 0    # solutions found
+    self.nodes = 0        # guesses made
+    self.backtracks = 0   # guesses that led to a contradiction
+    self.max_depth = 0
+    self.elapsed = 0.0
+
+  def __repr__(self):
+    return f'<Search {self.status}: {self.nodes} nodes, {self.backtracks} backtracks, depth {self.max_depth}, {self.elapsed:.3f}s>'
+
+  def simple(self):
+    return {name: getattr(self, name) for name in self.__slots__}
+
+
+def settle(board):
+  # Propagate with the inference rules. Return whether the board is still consistent.
+  try:
+    board.propagate()
+  except Contradiction:
+    return False
+  return board.find_contradiction() is None
+
+
+def choose_branch(board):
+  # Pick the unknown Cell to guess on and the order of colors to try.
+  # Prefers the frontier of the incomplete island with the fewest ways out, trying white first.
+  state = board.state
+  frontiers = {}
+  for i in range(state.size):
+    if state.color[i] == unknown:
+      for rid in state.potential_of(i):
+        if state.origin[rid] >= 0:
+          frontiers.setdefault(rid, []).append(i)
+  if frontiers:
+    frontier = min(frontiers.values(), key=len)
+    return board.cell_list[frontier[0]], [white, black]
+  return board.cell_list[state.color.index(unknown)], [black, white]
+
+
+def backtrack(board, node_limit=None, time_limit=None, count=1, found=None):
+  # Finish *board* by guessing, propagating and undoing guesses that lead to a contradiction.
+  # Stops after *node_limit* guesses or *time_limit* seconds. The board is left solved, or as it was if the search fails.
+  # With *count* > 1, carries on after a solution until it has found *count* of them or tried every guess, and leaves
+  # the board with the first; stats.solutions says how many it found. count=2 tells whether a puzzle's solution is unique.
+  # Each solution's get_list_form() is also appended to the list *found*, if given.
+  stats = SearchStats()
+  start = perf_counter()
+  owns_trail = board.state.trail is None
+  base = board.checkpoint()
+  stack = []    # (checkpoint token, Cell, colors left to try)
+  first = None  # the first solution, while looking for more
+
+  consistent = settle(board)
+  while True:
+    solved = consistent and board.is_solved()
+    if solved:
+      stats.solutions += 1
+      if found is not None:
+        found.append(board.get_list_form())
+      if stats.solutions >= count:
+        stats.status = 'solved'
+        if first is not None:
+          board.rollback(base)
+          board.paint_solution(first)
+        break
+      if first is None:
+        first = board.get_list_form()
+    if (node_limit is not None and stats.nodes >= node_limit) or (time_limit is not None and perf_counter()-start >= time_limit):
+      stats.status = 'budget'
+      board.rollback(base)
+      break
+
+    if consistent and not solved:
+      cell, colors = choose_branch(board)
+      stack.append((board.checkpoint(), cell, colors))
+      stats.max_depth = max(stats.max_depth, len(stack))
+    elif not consistent:
+      stats.backtracks += 1
+
+    while stack and not stack[-1][2]:
+      stack.pop()
+    if not stack:
+      board.rollback(base)
+      if first is None:
+        stats.status = 'unsolvable'
+      else:
+        stats.status = 'solved'
+        board.paint_solution(first)
+      break
+
+    token, cell, colors = stack[-1]
+    board.rollback(token)
+    stats.nodes += 1
+    try:
+      board.set_color(colors.pop(0), cell)
+    except Contradiction:
+      consistent = False
+      continue
+    consistent = settle(board)
+
+  if owns_trail:
+    board.commit()
+  stats.elapsed = perf_counter() - start
+  return stats
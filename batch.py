@@ -0,0 +1,269 @@
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import chain, islice, repeat
+from time import perf_counter
+import argparse
+import os
+import sys
+
+from backtrack import backtrack
+from board import Board
+from cache import SolutionCache
+from cost import DEFAULT_MODEL, cost_class, estimate, load_model
+from gridstate import Contradiction
+from packed import PackedReader, SUFFIX
+from propagation import Interrupted
+from stream import RecordWriter, read_stream
+
+
+def read_puzzles(*paths, skip=()):
+  # Yield (puzzle_id, grid) for every puzzle in *paths* whose id isn't in *skip*, reading them as they're needed.
+  # A .nkb file is a packed corpus (see packed.py); anything else, including '-' for stdin, holds JSON puzzles one per
+  # line, concatenated, or in a list (see stream.read_stream).
+  for path in paths:
+    if path.endswith(SUFFIX):
+      with PackedReader(path) as reader:
+        for view in reader:
+          puzzle_id = view.id
+          grid = None if puzzle_id in skip else view.grid()
+          del view    # no view may be left when the reader closes, even if this generator is closed while suspended
+          if grid is not None:
+            yield puzzle_id, grid
+    else:
+      for puzzle_id, grid in read_stream(path):
+        if puzzle_id not in skip:
+          yield puzzle_id, grid
+
+
+def read_boards(*paths, skip=()):
+  # Like read_puzzles, but yield (puzzle_id, Board), building each Board only when it's reached.
+  for puzzle_id, grid in read_puzzles(*paths, skip=skip):
+    yield puzzle_id, Board(grid)
+
+
+def solve_record(puzzle_id, grid, time_limit=None, search=True, cache=None, interrupt=None):
+  # Solve one puzzle without printing or dumping, and describe the outcome.
+  # status is 'solved', 'unsolved' (inference stalled, no search), 'unsolvable', 'timeout' or 'error'.
+  # With a SolutionCache *cache*, solved puzzles are looked up and stored there, and 'cache' is 'hit' or 'miss'.
+  # *interrupt* becomes the board's interrupt callback (see Propagator.run); the status is that of the Interrupted it raises.
+  start = perf_counter()
+  record = {'id': puzzle_id, 'status': None, 'solution': None, 'cycles': 0, 'nodes': 0}
+  try:
+    board = Board(grid)
+    board.interrupt = interrupt
+    if cache is not None:
+      record['cache'] = 'miss'
+      if board.solve_from_cache(cache):
+        record['cache'] = 'hit'
+    if record.get('cache') != 'hit':
+      record['cycles'] = board.propagator.run()
+    if board.is_solved():
+      record['status'] = 'solved'
+    elif search:
+      remaining = None if time_limit is None else max(0.0, time_limit - (perf_counter()-start))
+      stats = backtrack(board, time_limit=remaining)
+      record['status'] = {'solved': 'solved', 'unsolvable': 'unsolvable', 'budget': 'timeout'}[stats.status]
+      record['nodes'] = stats.nodes
+    else:
+      record['status'] = 'unsolved'
+    record['solution'] = board.get_list_form()
+    if cache is not None and record['status'] == 'solved' and record['cache'] == 'miss':
+      cache.put(grid, record['solution'])
+  except Contradiction:
+    record['status'] = 'unsolvable'
+  except Interrupted as e:
+    record['status'] = e.status
+  except Exception as e:
+    record['status'] = 'error'
+    record['error'] = repr(e)
+  record['wall_time'] = perf_counter() - start
+  return record
+
+
+_cache = None   # the worker process's SolutionCache, see open_cache
+
+
+def open_cache(path, capacity):
+  # Pool initializer: give the worker its own in-memory cache in front of the sqlite cache at *path*.
+  global _cache
+  _cache = SolutionCache(capacity, path)
+
+
+def deadline(time_limit):
+  # An interrupt callback for solve_record that times the solve out *time_limit* seconds from now, or None for no limit.
+  if time_limit is None:
+    return None
+  end = perf_counter() + time_limit
+
+  def interrupt():
+    if perf_counter() > end:
+      raise Interrupted('timeout')
+  return interrupt
+
+
+def solve_chunk(chunk, time_limit=None, search=True):
+  return [solve_record(puzzle_id, grid, time_limit, search, _cache, deadline(time_limit)) for puzzle_id, grid in chunk]
+
+
+def estimate_chunk(grids, model=DEFAULT_MODEL):
+  # cost.estimate for each of *grids*, in a worker since it runs a reach pass. A grid it fails on is given no features
+  # and the cheapest class, and is left for solve_record to report as an error.
+  estimates = []
+  for grid in grids:
+    try:
+      estimates.append(estimate(grid, model))
+    except Exception:
+      estimates.append({'features': None, 'predicted_cost': 0.0, 'predicted_class': model['classes'][0][0]})
+  return estimates
+
+
+def _chunks(puzzles, chunk_size):
+  puzzles = iter(puzzles)
+  while chunk := list(islice(puzzles, chunk_size)):
+    yield chunk
+
+
+def solve_batch(puzzles, workers=None, chunk_size=16, time_limit=None, search=True, ordered=True, cache=None,
+                cache_size=1024, schedule=False, window=256, hard_workers=1, hard_time_limit=None, model=None):
+  # Solve (puzzle_id, grid) pairs from the iterable *puzzles* over a process pool and yield their records.
+  # Puzzles are sent in chunks of *chunk_size*, with at most two chunks per worker in flight, so *puzzles* can be a
+  # stream of any length. *time_limit* is in seconds per puzzle, propagation included. With *ordered*, records come out
+  # in input order, and reading stops while two chunks per worker wait on a slow earlier one; otherwise they come out as
+  # chunks finish. With *cache*, the path of a sqlite SolutionCache the workers share, each worker keeps the
+  # *cache_size* solutions it used last in memory.
+  # With *schedule*, puzzles are started most expensive first and the likely expensive ones get a pool of their own;
+  # see _solve_scheduled for that and the other arguments.
+  workers = workers or os.cpu_count() or 1
+  initializer, initargs = (open_cache, (cache, cache_size)) if cache else (None, ())
+  if schedule:
+    yield from _solve_scheduled(puzzles, workers, chunk_size, time_limit, search, ordered, initializer, initargs, window,
+                                hard_workers, hard_time_limit, model or DEFAULT_MODEL)
+    return
+  chunks = _chunks(puzzles, chunk_size)
+  depth = 2*workers
+  with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as pool:
+    pending = {}    # future -> chunk index
+    done = {}       # chunk index -> records, for ordered output
+    next_idx = 0
+    submitted = 0
+    while True:
+      # Keep *depth* chunks in flight, but stop reading ahead while as many finished ones wait on a slow earlier chunk.
+      while len(pending) < depth and len(done) < depth:
+        chunk = next(chunks, None)
+        if chunk is None:
+          break
+        pending[pool.submit(solve_chunk, chunk, time_limit, search)] = submitted
+        submitted += 1
+      if not pending:
+        break
+
+      finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+      for future in finished:
+        idx = pending.pop(future)
+        if ordered:
+          done[idx] = future.result()
+        else:
+          yield from future.result()
+      while next_idx in done:
+        yield from done.pop(next_idx)
+        next_idx += 1
+
+
+def _solve_scheduled(puzzles, workers, chunk_size, time_limit, search, ordered, initializer, initargs, window,
+                     hard_workers, hard_time_limit, model):
+  # solve_batch with a schedule: reads *window* puzzles ahead (unless *window* records already wait on a slow earlier
+  # one), estimates what each will cost from its clues in the main pool (see estimate_chunk with *model*) and queues
+  # them most expensive first. Puzzles predicted 'hard' go one at a time to a pool of their own, *hard_workers* of the
+  # *workers* processes with *hard_time_limit* seconds each (by default four times *time_limit*), so they can't hold up
+  # the cheap ones; the rest go in chunks to the main pool. Each record gets the estimate's fields and the pool it ran
+  # in, to set against its wall_time (see cost.fit and cost.report).
+  if hard_time_limit is None and time_limit is not None:
+    hard_time_limit = 4*time_limit
+  puzzles = enumerate(puzzles)
+  queues = {'main': deque(), 'hard': deque()}     # pool -> tasks waiting, each a list of (index, puzzle_id, grid, estimate)
+  limits = {'main': time_limit, 'hard': hard_time_limit}
+  main_workers = max(1, workers - hard_workers)
+  with ProcessPoolExecutor(main_workers, initializer=initializer, initargs=initargs) as main_pool, \
+       ProcessPoolExecutor(hard_workers, initializer=initializer, initargs=initargs) as hard_pool:
+    pools = {'main': (main_pool, 2*main_workers), 'hard': (hard_pool, 2*hard_workers)}   # pool -> (executor, tasks in flight)
+    in_flight = Counter()
+    pending = {}    # future -> (pool, task)
+    done = {}       # puzzle index -> record, for ordered output
+    next_idx = 0
+    exhausted = False
+    while True:
+      if not exhausted and not queues['main'] and len(queues['hard']) < window and len(done) < window:
+        ahead = list(islice(puzzles, window))
+        exhausted = len(ahead) < window
+        grids = _chunks((grid for _, (_, grid) in ahead), chunk_size)
+        estimates = chain.from_iterable(main_pool.map(estimate_chunk, grids, repeat(model)))
+        tasks = sorted(((idx, puzzle_id, grid, prediction) for (idx, (puzzle_id, grid)), prediction in zip(ahead, estimates)),
+                       key=lambda task: -task[3]['predicted_cost'])
+        queues['hard'].extend([task] for task in tasks if task[3]['predicted_class'] == 'hard')
+        easy = [task for task in tasks if task[3]['predicted_class'] != 'hard']
+        queues['main'].extend(easy[start:start+chunk_size] for start in range(0, len(easy), chunk_size))
+      for name, (pool, depth) in pools.items():
+        while queues[name] and in_flight[name] < depth:
+          task = queues[name].popleft()
+          chunk = [(puzzle_id, grid) for _, puzzle_id, grid, _ in task]
+          pending[pool.submit(solve_chunk, chunk, limits[name], search)] = name, task
+          in_flight[name] += 1
+      if not pending:
+        break
+
+      finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+      for future in finished:
+        name, task = pending.pop(future)
+        in_flight[name] -= 1
+        for (idx, _, _, prediction), record in zip(task, future.result()):
+          record.update(prediction, pool=name)
+          if ordered:
+            done[idx] = record
+          else:
+            yield record
+      while next_idx in done:
+        yield done.pop(next_idx)
+        next_idx += 1
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Solve Nurikabe puzzles from JSON/JSONL files in parallel.")
+  parser.add_argument('paths', nargs='+', help="puzzle files (JSON, JSONL or .nkb), or - for stdin")
+  parser.add_argument('-o', '--output', default='-', help="write result records here as JSONL (default: stdout)")
+  parser.add_argument('--resume', action='store_true', help="skip the puzzles already in the output and append to it")
+  parser.add_argument('-w', '--workers', type=int, default=None)
+  parser.add_argument('-c', '--chunk-size', type=int, default=16)
+  parser.add_argument('-t', '--timeout', type=float, default=None, help="seconds per puzzle")
+  parser.add_argument('--no-search', action='store_true', help="only use the inference rules")
+  parser.add_argument('--unordered', action='store_true', help="write records as they finish")
+  parser.add_argument('--cache', help="sqlite file of known solutions to look puzzles up in and add to")
+  parser.add_argument('--cache-size', type=int, default=1024, help="solutions each worker keeps in memory")
+  parser.add_argument('--schedule', action='store_true',
+                      help="start the puzzles predicted to be slowest first, and give the hardest a pool of their own")
+  parser.add_argument('--window', type=int, default=256, help="puzzles to read ahead and order with --schedule")
+  parser.add_argument('--hard-workers', type=int, default=1, help="workers set aside for hard puzzles with --schedule")
+  parser.add_argument('--hard-timeout', type=float, default=None, help="seconds per hard puzzle (default: 4 x --timeout)")
+  parser.add_argument('--model', help="cost model from cost.py fit (default: the built-in one)")
+  args = parser.parse_args(argv)
+  if args.resume and args.output == '-':
+    parser.error("--resume needs --output")
+  model = load_model(args.model)
+
+  lookups = Counter()
+  costs = Counter()     # (predicted class, actual class) -> puzzles
+  with RecordWriter(args.output, resume=args.resume) as writer:
+    for record in solve_batch(read_puzzles(*args.paths, skip=writer.done), args.workers, args.chunk_size, args.timeout,
+                              not args.no_search, not args.unordered, args.cache, args.cache_size, args.schedule,
+                              args.window, args.hard_workers, args.hard_timeout, model):
+      writer.write(record)
+      lookups[record.get('cache')] += 1
+      if 'predicted_class' in record:
+        costs[record['predicted_class'], cost_class(record['wall_time'], model)] += 1
+  if args.cache:
+    print(f"cache: {lookups['hit']} hits, {lookups['miss']} misses", file=sys.stderr)
+  if costs:
+    print("cost (predicted -> actual): " + ', '.join(f"{p}->{a}: {n}" for (p, a), n in sorted(costs.items())), file=sys.stderr)
+
+
+if __name__ == '__main__':
+  main()
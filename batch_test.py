@@ -0,0 +1,54 @@
+import json
+
+from batch import *
+from cost import FEATURES
+
+
+def test_solve_record(GRID_1_LIST, SOL_1_LIST):
+    record = solve_record('a', GRID_1_LIST)
+    assert record['status'] == 'solved' and record['solution'] == SOL_1_LIST, "solve_record failed"
+
+
+def test_solve_chunk_timeout(GRID_1_LIST):
+    assert solve_chunk([('a', GRID_1_LIST)], time_limit=0)[0]['status'] == 'timeout', "propagation ran past the time limit"
+    assert solve_chunk([('a', GRID_1_LIST)], time_limit=10)[0]['status'] == 'solved', "deadline hit too soon"
+
+
+def test_solve_batch_ordered(GRID_1_LIST, SOL_1_LIST):
+    records = list(solve_batch([(str(i), GRID_1_LIST) for i in range(5)], workers=2, chunk_size=2))
+    assert [r['id'] for r in records] == ['0', '1', '2', '3', '4'], "solve_batch lost order"
+    assert all(r['solution'] == SOL_1_LIST for r in records), "solve_batch failed"
+
+
+def test_read_puzzles(GRID_1_LIST, tmp_path):
+    path = tmp_path / 'puzzles.jsonl'
+    path.write_text(json.dumps({'id': 'x', 'grid': GRID_1_LIST}) + '\n' + json.dumps(GRID_1_LIST) + '\n')
+    assert [pid for pid, _ in read_puzzles(str(path))] == ['x', f'{path}:1'], "read_puzzles ids wrong"
+
+
+def test_solve_batch_cache(GRID_1_LIST, SOL_1_LIST, tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    flipped = [row[::-1] for row in GRID_1_LIST]
+    records = list(solve_batch([('a', GRID_1_LIST)], workers=1, cache=path))
+    records += list(solve_batch([('b', flipped)], workers=1, cache=path))
+    assert [r['cache'] for r in records] == ['miss', 'hit'], "cache not shared between runs"
+    assert records[1]['solution'] == [row[::-1] for row in SOL_1_LIST], "cached solution not flipped back"
+
+
+def test_solve_batch_schedule(GRID_1_LIST, SOL_1_LIST):
+    big = [[0] * 7 for _ in range(7)]
+    big[0][0], big[3][3], big[6][6] = 3, 4, 2
+    model = dict(DEFAULT_MODEL, classes=[['easy', 0.004], ['hard', None]])
+    puzzles = [('small', GRID_1_LIST), ('big', big), ('small2', GRID_1_LIST)]
+    hard = {pid for pid, grid in puzzles if estimate(grid, model)['predicted_class'] == 'hard'}
+    assert hard == {'big'}, "test puzzles not classed as expected"
+    records = list(solve_batch(puzzles, workers=2, chunk_size=2, schedule=True, window=2, model=model))
+    assert [r['id'] for r in records] == ['small', 'big', 'small2'], "scheduled solve_batch lost order"
+    assert [r['pool'] for r in records] == ['main', 'hard', 'main'], "hard puzzle not sent to the hard pool"
+    assert records[0]['solution'] == SOL_1_LIST and set(records[1]['features']) == set(FEATURES), "scheduled records incomplete"
+
+
+def test_solve_batch_schedule_bad_puzzle(GRID_1_LIST):
+    records = list(solve_batch([('empty', []), ('a', GRID_1_LIST)], workers=2, schedule=True))
+    assert [r['status'] for r in records] == ['error', 'solved'], "bad puzzle not recorded as an error"
+    assert records[0]['features'] is None and records[0]['pool'] == 'main', "bad puzzle not given the fallback estimate"
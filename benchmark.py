@@ -0,0 +1,291 @@
+from array import array
+from collections import deque
+from time import perf_counter
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+from backtrack import backtrack
+from board import Board
+from expansion import ExpansionEngine
+from propagation import Propagator, RULES
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CORPUS_FILE = os.path.join(HERE, 'benchmark_corpus.json')      # group -> list of grids; groups are "<size>-<difficulty>" like puzzle_scraper's encode table
+BASELINE_FILE = os.path.join(HERE, 'benchmark_baseline.json')
+METRICS = ('solve',) + RULES
+PERCENTILES = (50, 90, 99)
+
+
+class TimedPropagator(Propagator):
+  # Propagator that adds up the time spent in each rule.
+
+  def __init__(self, board):
+    super().__init__(board)
+    self.rule_times = dict.fromkeys(RULES, 0.0)
+
+  def invoke(self, rule):
+    start = perf_counter()
+    super().invoke(rule)
+    self.rule_times[rule] += perf_counter() - start
+
+
+def load_corpus(path=CORPUS_FILE, groups=None):
+  with open(path, 'r') as read_file:
+    corpus = json.load(read_file)
+  if groups:
+    corpus = {group: corpus[group] for group in groups}
+  return corpus
+
+
+def time_puzzle(grid, time_limit=None):
+  # Solve *grid* quietly, falling back to search. Returns the wall time of the whole solve and of each rule, and the status.
+  # The garbage collector is off while it runs, as in timeit, so a collection of some earlier puzzle's garbage isn't
+  # billed to this one.
+  gc.collect()
+  gc.disable()
+  try:
+    start = perf_counter()
+    board = Board(grid)
+    board.expansion_engine = ExpansionEngine()    # cold cache, so repeats are comparable
+    board._propagator = propagator = TimedPropagator(board)
+    propagator.run()
+    status = 'solved' if board.is_solved() else backtrack(board, time_limit=time_limit).status
+    timing = {'solve': perf_counter() - start, 'status': status}
+  finally:
+    gc.enable()
+  timing.update(propagator.rule_times)
+  return timing
+
+
+def peak_memory(grid, time_limit=None):
+  # Peak bytes allocated while solving *grid*.
+  tracemalloc.start()
+  try:
+    time_puzzle(grid, time_limit)
+    return tracemalloc.get_traced_memory()[1]
+  finally:
+    tracemalloc.stop()
+
+
+def startup(repeat=5):
+  # Best wall time of a fresh interpreter importing the solver, and of the batch CLI solving one corpus puzzle.
+  first = next(iter(load_corpus().values()))[0]
+  with tempfile.TemporaryDirectory() as tmp:
+    path = os.path.join(tmp, 'puzzle.json')
+    with open(path, 'w') as write_file:
+      json.dump(first, write_file)
+    commands = {
+                  'import board': [sys.executable, '-c', 'import board'],
+                  'solve one puzzle': [sys.executable, os.path.join(HERE, 'batch.py'), path, '-w', '1', '-o', os.devnull],
+                }
+    times = {}
+    for name, command in commands.items():
+      best = None
+      for _ in range(repeat):
+        start = perf_counter()
+        subprocess.run(command, cwd=HERE, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        elapsed = perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+      times[name] = best
+  return times
+
+
+def percentile(values, p):
+  # Nearest-rank percentile of a non-empty list.
+  values = sorted(values)
+  return values[max(0, -(-len(values)*p//100) - 1)]
+
+
+def _reference_workload(size=24):
+  # A fixed stand-in for the solver's inner loops, kept here so it doesn't change when the solver does: flood fills
+  # over a neighbor table with sets and a deque, and a union-find over an array, on a size x size grid.
+  nbors = tuple(tuple(n for n in (i-1 if i % size else -1, i+1 if (i+1) % size else -1, i-size, i+size) if 0 <= n < size*size)
+                for i in range(size*size))
+  blocked = {i for i in range(size*size) if (i*7919) % 5 == 0}
+  for start in range(0, size*size, 7):
+    seen, queue = {start}, deque([start])
+    while queue:
+      for n in nbors[queue.popleft()]:
+        if n not in seen and n not in blocked:
+          seen.add(n)
+          queue.append(n)
+  parent = array('i', range(size*size))
+  for i in range(size*size):
+    for n in nbors[i]:
+      a, b = i, n
+      while parent[a] != a:
+        a = parent[a]
+      while parent[b] != b:
+        b = parent[b]
+      if a != b:
+        parent[max(a, b)] = min(a, b)
+
+
+def calibrate(rounds=5):
+  # Median time of the reference workload, so runs on different machines, or on one machine at busier or quieter times,
+  # can be compared. Like time_puzzle, it runs with the garbage collector off.
+  times = []
+  gc.collect()
+  gc.disable()
+  try:
+    for _ in range(rounds):
+      start = perf_counter()
+      _reference_workload()
+      times.append(perf_counter() - start)
+  finally:
+    gc.enable()
+  return percentile(times, 50)
+
+
+def _time_round(corpus, time_limit):
+  # One round of run: ({group: time_puzzle of each of its grids}, calibration times taken after each group).
+  timings, calibrations = {}, []
+  for group, grids in corpus.items():
+    timings[group] = [time_puzzle(grid, time_limit) for grid in grids]
+    calibrations.append(calibrate())
+  return timings, calibrations
+
+
+def run(corpus, repeat=1, time_limit=None, memory=True):
+  # Benchmark every group of *corpus*. Each puzzle is timed *repeat* times and its best time for each metric kept; each
+  # metric gets percentiles over the group's puzzles and their total. The repeats are rounds over the whole corpus, each
+  # in a fresh interpreter: how fast the solver runs differs from one process to the next by more than any one process
+  # drifts, and separate rounds also keep a busy stretch of the machine to one run of a few puzzles. The machine is
+  # calibrated next to every group in every round and the median kept. A metric's *spread* is how far its median
+  # round's total is above its best round's, a measure of how noisy the machine was for it.
+  import multiprocessing
+  from concurrent.futures import ProcessPoolExecutor    # not at the top, so importing this module stays light
+  best = {group: [None] * len(grids) for group, grids in corpus.items()}
+  rounds = {group: {metric: [] for metric in METRICS} for group in corpus}   # group -> metric -> total of each round
+  calibrations = []
+  for _ in range(repeat):
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+      timings, round_calibrations = pool.submit(_time_round, corpus, time_limit).result()
+    calibrations.extend(round_calibrations)
+    for group, group_timings in timings.items():
+      for metric in METRICS:
+        rounds[group][metric].append(sum(timing[metric] for timing in group_timings))
+      for k, timing in enumerate(group_timings):
+        if best[group][k] is not None:
+          timing.update((metric, min(timing[metric], best[group][k][metric])) for metric in METRICS)
+        best[group][k] = timing
+  report = {'calibration': percentile(calibrations, 50), 'groups': {}}
+  for group, grids in corpus.items():
+    timings = best[group]
+    stats = {
+              metric: {f'p{p}': percentile([timing[metric] for timing in timings], p) for p in PERCENTILES}
+              for metric in METRICS
+            }
+    for metric in METRICS:
+      stats[metric]['total'] = sum(timing[metric] for timing in timings)
+      totals = rounds[group][metric]
+      stats[metric]['spread'] = percentile(totals, 50) / min(totals) - 1 if min(totals) else 0.0
+    stats['unsolved'] = sum(timing['status'] != 'solved' for timing in timings)
+    if memory:
+      stats['peak_memory'] = max(peak_memory(grid, time_limit) for grid in grids)
+    report['groups'][group] = stats
+  return report
+
+
+def compare(report, baseline, tolerance=0.25, min_delta=0.01):
+  # List every way *report* is worse than *baseline*: a group's total time more than *tolerance* plus the larger of the
+  # two runs' spreads, and more than *min_delta* seconds, slower after scaling by the machines' calibration times; more
+  # peak memory than *tolerance* allows; or more unsolved puzzles. The total over a group moves much less between runs
+  # than any one puzzle's time, so it's what's gated on; baselines saved before totals were recorded are compared by
+  # median.
+  scale = report['calibration'] / baseline['calibration']
+  regressions = []
+  for group, base in baseline['groups'].items():
+    current = report['groups'].get(group)
+    if current is None:
+      continue
+    for metric in METRICS:
+      if metric not in base:
+        continue    # a rule added since the baseline was saved
+      key = 'total' if 'total' in base[metric] else 'p50'
+      noise = max(base[metric].get('spread', 0.0), current[metric].get('spread', 0.0))
+      expected = base[metric][key] * scale
+      allowed = max(expected * (1+tolerance+noise), expected + min_delta)
+      if current[metric][key] > allowed:
+        regressions.append(f"{group} {metric}: {key} {current[metric][key]*1000:.2f}ms > {allowed*1000:.2f}ms allowed")
+    if 'peak_memory' in base and 'peak_memory' in current and current['peak_memory'] > base['peak_memory'] * (1+tolerance):
+      regressions.append(f"{group} peak_memory: {current['peak_memory']} > {base['peak_memory']*(1+tolerance):.0f} bytes allowed")
+    if current['unsolved'] > base['unsolved']:
+      regressions.append(f"{group} unsolved: {current['unsolved']} > {base['unsolved']}")
+  return regressions
+
+
+def format_report(report):
+  lines = [f"{'group':<12}" + ''.join(f'{metric+" p50/p90":>28}' for metric in METRICS) + f"{'peak KiB':>10}{'unsolved':>10}"]
+  for group, stats in report['groups'].items():
+    line = f'{group:<12}'
+    for metric in METRICS:
+      line += f"{stats[metric]['p50']*1000:.2f}/{stats[metric]['p90']*1000:.2f}ms".rjust(28)
+    line += f"{stats.get('peak_memory', 0)//1024:>10}{stats['unsolved']:>10}"
+    lines.append(line)
+  return '\n'.join(lines)
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Time the solver on the benchmark corpus and check for regressions.")
+  parser.add_argument('groups', nargs='*', help="corpus groups to run, e.g. 10-hard (default: all)")
+  parser.add_argument('--corpus', default=CORPUS_FILE)
+  parser.add_argument('--baseline', default=BASELINE_FILE)
+  parser.add_argument('--save-baseline', action='store_true', help="write this run as the new baseline")
+  parser.add_argument('--tolerance', type=float, default=0.25)
+  parser.add_argument('--repeat', type=int, default=5)
+  parser.add_argument('--time-limit', type=float, default=10, help="search seconds per puzzle")
+  parser.add_argument('--no-memory', action='store_true', help="skip the peak memory pass")
+  parser.add_argument('--confirm', type=int, default=1, help="times to re-run a group that regressed before failing")
+  parser.add_argument('--startup', action='store_true', help="only time cold starts of the solver")
+  args = parser.parse_args(argv)
+
+  if args.startup:
+    for name, elapsed in startup(args.repeat).items():
+      print(f"{name:<20}{elapsed*1000:>10.1f}ms")
+    return 0
+
+  corpus = load_corpus(args.corpus, args.groups)
+  report = run(corpus, args.repeat, args.time_limit, not args.no_memory)
+  print(format_report(report))
+
+  if args.save_baseline:
+    with open(args.baseline, 'w') as write_file:
+      json.dump(report, write_file, indent=2)
+    print(f"Saved baseline to {args.baseline}.")
+    return 0
+
+  try:
+    with open(args.baseline, 'r') as read_file:
+      baseline = json.load(read_file)
+  except FileNotFoundError:
+    print(f"No baseline at {args.baseline}; run with --save-baseline to create one.")
+    return 0
+  regressions = compare(report, baseline, args.tolerance)
+  for _ in range(args.confirm):
+    # A slow stretch of a shared machine can outlast a whole group's rounds; a real regression shows up again when the
+    # groups it's in are run once more, so only what every re-run repeats fails the gate.
+    flagged = [group for group in corpus if any(regression.startswith(group + ' ') for regression in regressions)]
+    if not flagged:
+      break
+    print(f"\nRe-running {', '.join(flagged)} to confirm {len(regressions)} regression(s).")
+    rerun = run({group: corpus[group] for group in flagged}, args.repeat, args.time_limit, not args.no_memory)
+    regressions = [regression for regression in compare(rerun, baseline, args.tolerance)
+                   if regression.split(':')[0] in {old.split(':')[0] for old in regressions}]
+  if regressions:
+    print(f"\nPERFORMANCE REGRESSION ({len(regressions)}):", file=sys.stderr)
+    for regression in regressions:
+      print(f"  {regression}", file=sys.stderr)
+    return 1
+  print("\nNo regressions against the baseline.")
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,68 @@
+import json
+
+from benchmark import *
+
+
+def REPORT(scale=1.0, unsolved=0):
+    stats = {metric: {'p50': 0.01*scale, 'p90': 0.02*scale, 'p99': 0.03*scale, 'total': 0.1*scale} for metric in METRICS}
+    stats['unsolved'] = unsolved
+    stats['peak_memory'] = 1000
+    return {'calibration': 0.1, 'groups': {'5-normal': stats}}
+
+
+def test_percentile():
+    assert percentile([5, 1, 4, 2, 3], 50) == 3, "percentile failed"
+    assert percentile([5, 1, 4, 2, 3], 99) == 5, "percentile failed"
+
+
+def test_compare_passes():
+    assert compare(REPORT(1.1), REPORT()) == [], "false regression"
+
+
+def test_compare_gates_on_total():
+    noisy = REPORT()
+    noisy['groups']['5-normal']['solve']['p50'] *= 2
+    assert compare(noisy, REPORT()) == [], "gated on one puzzle's time"
+    old = REPORT()
+    for stats in old['groups']['5-normal'].values():
+        if isinstance(stats, dict):
+            del stats['total']
+    assert len(compare(REPORT(3.0), old)) == len(METRICS), "old baseline not compared by median"
+
+
+def test_compare_flags_regressions():
+    assert len(compare(REPORT(2.0), REPORT())) == len(METRICS), "missed slowdown"
+    assert compare(REPORT(unsolved=1), REPORT()), "missed unsolved puzzle"
+
+
+def test_compare_allows_spread():
+    noisy = REPORT()
+    for metric in METRICS:
+        noisy['groups']['5-normal'][metric]['spread'] = 1.0
+    assert compare(REPORT(2.0), noisy) == [], "spread not allowed for"
+    assert compare(REPORT(3.0), noisy), "missed slowdown beyond spread"
+
+
+def test_run():
+    report = run(load_corpus(groups=['5-normal']), repeat=2, time_limit=10, memory=False)
+    stats = report['groups']['5-normal']
+    assert report['calibration'] > 0 and stats['unsolved'] == 0, "run failed"
+    assert all(stats[metric]['spread'] >= 0 and stats[metric]['total'] >= stats[metric]['p50'] for metric in METRICS), "run failed"
+
+
+def test_main_confirms_regressions(tmp_path):
+    baseline = REPORT(0.001)
+    baseline['calibration'] = calibrate()
+    (tmp_path / 'baseline.json').write_text(json.dumps(baseline))
+    argv = ['5-normal', '--baseline', str(tmp_path / 'baseline.json'), '--repeat', '1', '--no-memory']
+    assert main(argv) == 1, "re-run hid a real regression"
+
+
+def test_time_puzzle():
+    timing = time_puzzle(load_corpus(groups=['5-normal'])['5-normal'][0])
+    assert timing['status'] == 'solved' and all(timing[metric] >= 0 for metric in METRICS), "time_puzzle failed"
+
+
+def test_startup():
+    times = startup(repeat=1)
+    assert set(times) == {'import board', 'solve one puzzle'} and all(t > 0 for t in times.values()), "startup failed"
@@ -0,0 +1,213 @@
+from functools import cached_property, lru_cache
+
+from gridstate import unknown, white, black
+from propagation import Propagator, SWEEPS
+
+# bytes.translate tables turning a color buffer into the binary digits of a mask, one digit per cell
+DIGITS = {color: bytes.maketrans(bytes((unknown, white, black)), bytes(ord('1') if c == color else ord('0') for c in (unknown, white, black)))
+          for color in (unknown, white, black)}
+
+
+def bits(ids):
+  mask = 0
+  for i in ids:
+    mask |= 1 << i
+  return mask
+
+
+def ids(mask):
+  # Cell ids of the set bits of *mask*, in increasing order.
+  digits = bin(mask)[:1:-1]
+  found = []
+  i = digits.find('1')
+  while i >= 0:
+    found.append(i)
+    i = digits.find('1', i+1)
+  return found
+
+
+@lru_cache(maxsize=None)
+def edge_masks(width, height):
+  # (all cells, cells not in the left column, cells not in the right column, top-left cells of the 2x2 squares)
+  full = (1 << width*height) - 1
+  left = bits(range(0, width*height, width))
+  not_right = full & ~(left << (width-1))
+  return full, full & ~left, not_right, not_right & (full >> width)
+
+
+class Bitboard:
+  # A snapshot of a GridState's colors as int bitmasks, bit i standing for cell id i, and the rules that can be
+  # computed on them for the whole board at once with shifts, ANDs and ORs.
+  #
+  # Reach matches Board._reach_layers except where an island could bridge to a white region that has no clue: the
+  # cost of annexing those depends on the path taken, so reach() gives up on such islands and returns None.
+
+  def __init__(self, state):
+    self.state = state
+    self.width = state.width
+    self.full, self.not_left, self.not_right, self.square_anchors = edge_masks(state.width, state.height)
+    colors = bytes(state.color)[::-1]   # most significant digit first
+    self.unknown, self.white, self.black = (int(colors.translate(DIGITS[color]) or b'0', 2) for color in (unknown, white, black))
+
+  @cached_property
+  def islands(self):
+    # region id -> mask of its members, for every island
+    state = self.state
+    return {rid: bits(state.members(rid)) for rid in ids(self.white) if state.find(rid) == rid and state.origin[rid] >= 0}
+
+  @cached_property
+  def halos(self):
+    # (region id -> mask of the unknown cells it borders, cells bordering an island, cells bordering two or more)
+    halos = {rid: self.dilate(island) & self.unknown for rid, island in self.islands.items()}
+    bordered = crowded = 0
+    for halo in halos.values():
+      crowded |= bordered & halo
+      bordered |= halo
+    return halos, bordered, crowded
+
+  @cached_property
+  def orphan_halo(self):
+    # Unknown cells bordering a white region without a clue.
+    orphans = self.white
+    for island in self.islands.values():
+      orphans &= ~island
+    return self.dilate(orphans) & self.unknown
+
+  def dilate(self, mask):
+    # *mask* plus the orthogonal neighbors of its cells.
+    w = self.width
+    return (mask | (mask << 1) & self.not_left | (mask >> 1) & self.not_right | (mask << w) | (mask >> w)) & self.full
+
+  def flood(self, seed, within):
+    # The cells of *within* connected to *seed* through *within*.
+    region, grown = 0, seed & within
+    while grown != region:
+      region = grown
+      grown = self.dilate(region) & within
+    return region
+
+  def reach(self, rid, depth_limit=None):
+    # Mask of the cells island *rid* could reach, or None if reaching them could involve a clueless white region.
+    state = self.state
+    steps = state.size_limit[rid] - state.count[rid]
+    if depth_limit is not None:
+      steps = min(steps, depth_limit)
+    halos, bordered, crowded = self.halos
+    allowed = self.unknown & ~(crowded | bordered & ~halos[rid])   # unknown cells no other island borders
+    orphan_halo = self.orphan_halo
+    reach = frontier = self.islands[rid]
+    for _ in range(steps):
+      frontier = self.dilate(frontier) & allowed & ~reach
+      if not frontier:
+        break
+      if frontier & orphan_halo:
+        return None
+      reach |= frontier
+    return reach
+
+  def pools(self):
+    # Top-left cells of the all-black 2x2 squares.
+    w, b = self.width, self.black
+    return self.square_anchors & b & (b >> 1) & (b >> w) & (b >> (w+1))
+
+  def pool_breakers(self):
+    # Unknown cells that are the only non-black cell of a 2x2 square.
+    w = self.width
+    offsets = (0, 1, w, w+1)
+    blacks = [self.black >> offset for offset in offsets]
+    breakers = 0
+    for k, offset in enumerate(offsets):
+      anchors = self.square_anchors & (self.unknown >> offset)
+      for j, black_corner in enumerate(blacks):
+        if j != k:
+          anchors &= black_corner
+      breakers |= anchors << offset
+    return breakers
+
+
+def reach_mask(board, bitboard, rid, depth_limit=None):
+  # Mask of the cells island *rid* could reach, falling back to Board._reach_layers where the bitboard can't tell.
+  reach = bitboard.reach(rid, depth_limit)
+  if reach is None:
+    reach = bits(set().union(*board._reach_layers(rid, depth_limit)))
+  return reach
+
+
+def find_contradiction(board):
+  # Board.find_contradiction on bitmasks.
+  state = board.state
+  bitboard = Bitboard(state)
+  if pools := bitboard.pools():
+    return f"pool at {state.coords(ids(pools)[0])}"
+
+  reachable = 0
+  for rid in sorted(bitboard.islands):
+    if state.count[rid] > state.size_limit[rid]:
+      return f"oversize island at {state.coords(state.origin[rid])}"
+    reach = reach_mask(board, bitboard, rid)
+    if bin(reach).count('1') < state.size_limit[rid]:
+      return f"island at {state.coords(state.origin[rid])} can't reach its size"
+    reachable |= reach
+  if stranded := bitboard.white & ~reachable:
+    return f"white region at {state.coords(min(state.find(i) for i in ids(stranded)))} can't reach an island"
+
+  blacks = bitboard.black
+  if blacks and bitboard.flood(blacks & -blacks, bitboard.full & ~bitboard.white) & blacks != blacks:
+    return "black is disconnected"
+  return None
+
+
+class BitboardPropagator(Propagator):
+  # Propagator for boards with the 'bitboard' backend. find_unreachable and prevent_pools sweep the whole board with
+  # bitmasks instead of tracking reach shells and squares, so changes only mark the islands whose reach mask they touch.
+
+  def __init__(self, board):
+    super().__init__(board)
+    self.reach_masks = {}   # island -> mask of its reach
+
+  def collect(self):
+    state = self.state
+    if not state.changes:
+      return
+    changes = set(state.changes)
+    state.changes.clear()
+    self.dirty_sweeps.update(SWEEPS)
+    color, cell_squares = state.color, state.geometry.cell_squares
+    for i in changes:
+      if color[i] == black:
+        self.dirty_squares.update(cell_squares[i])
+    if state.rolled_back:   # see Propagator
+      self.reset_islands()
+      return
+    w = state.width
+    touched = bits(changes)
+    touched |= (touched << 1) | (touched >> 1) | (touched << w) | (touched >> w)   # wrapping only over-approximates
+    for island, reach in self.reach_masks.items():
+      if reach & touched:
+        self.dirty_reach[island] = 0
+        self.dirty_expand.add(island)
+
+  def find_unreachable(self):
+    state, counter = self.state, self.counters['find_unreachable']
+    counter['runs'] += 1
+    if not self.dirty_reach:
+      return
+    bitboard, find = Bitboard(state), state.find
+    for island in sorted(self.dirty_reach):
+      counter['work'] += 1
+      self.reach_masks[island] = reach_mask(self.board, bitboard, find(island))
+    self.dirty_reach.clear()
+    reached = 0
+    for reach in self.reach_masks.values():
+      reached |= reach
+    cell_list = self.board.cell_list
+    self._decide('find_unreachable', black, [cell_list[i] for i in ids(bitboard.unknown & ~reached)])
+
+  def prevent_pools(self):
+    counter = self.counters['prevent_pools']
+    counter['runs'] += 1
+    if self.dirty_squares:
+      counter['work'] += 1
+      self.dirty_squares.clear()
+      cell_list = self.board.cell_list
+      self._decide('prevent_pools', white, [cell_list[i] for i in ids(Bitboard(self.state).pool_breakers())])
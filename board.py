@@ -1,34 +1,67 @@
-from copy import deepcopy
+from collections import Counter
+from itertools import chain
 from math import inf as INF
+from time import perf_counter
 import json
-from ordered_set import OrderedSet
 
-from board_display import *
+from backtrack import backtrack
+from bitboard import Bitboard, BitboardPropagator, ids, reach_mask, find_contradiction as find_contradiction_bitwise
+from connectivity import black_cut_cells, single_exits
+from expansion import ENGINE as EXPANSION_ENGINE
+from instrument import COUNTED_CALLS, count_calls
+from gridstate import GridState, Contradiction, unknown, white, black, NO_REGION, NO_LIMIT, NO_LABEL, BULLET
+from parallel import ParallelPropagator
 from pathtree import *
-from uniquequeue import UniqueQueue
+from propagation import Propagator
+from stream import read_stream
+
+# board_display (tkinter), ordered_set and vectorized (NumPy) are imported where they're used, so that importing the
+# solver stays quick and works on hosts without them.
 
 LAST_BOARD_FILE = 'last_board.json'
-unknown = 0
-white = 1
-black = 2
+BACKENDS = ('object', 'bitboard', 'numpy')
 
 class Cell:
-  def __init__(self, x, y, color, label=''):
-    self.x = x
-    self.y = y
-    self.color = color
-    self.label = str(label)
-    self.region = None
-    self.potential_regions = OrderedSet()  # Unknown cells next to a white region are either part of that region or black.
-                                           # Multiple regions can be adjacent without knowing whether they're the same region.
+  # View of one cell of a Board's GridState.
+  __slots__ = ('board', 'id', 'x', 'y')
+
+  def __init__(self, board, cell_id):
+    self.board = board
+    self.id = cell_id
+    self.x, self.y = board.state.coords(cell_id)
 
   @property
   def coords(self):
     return (self.x, self.y)
 
-  @coords.setter
-  def coords(self, coords):
-    self.x, self.y = coords
+  @property
+  def color(self):
+    return self.board.state.color[self.id]
+
+  @color.setter
+  def color(self, color):
+    state = self.board.state
+    state._write(state.color, self.id, color)
+
+  @property
+  def label(self):
+    code = self.board.state.label[self.id]
+    if code == NO_LABEL:
+      return ''
+    if code == BULLET:
+      return u"\u2022" # bullet
+    return str(code)
+
+  @property
+  def region(self):
+    rid = self.board.state.find(self.id)
+    return None if rid == NO_REGION else self.board.region_view(rid)
+
+  @property
+  def potential_regions(self):
+    # Unknown cells next to a white region are either part of that region or black.
+    # Multiple regions can be adjacent without knowing whether they're the same region.
+    return {self.board.region_view(rid) for rid in self.board.state.potential_of(self.id)}
 
   def __repr__(self):
     return f'C<{self.coords}-{self.color}-{int(bool(self.region))}>'
@@ -40,52 +73,95 @@ class Cell:
   def tcd(self, other):
     return abs(self.x-other.x) + abs(self.y-other.y)
 
-  def simple(self):
-    if self.region is None:
-      region_idx = None
-    else:
-      region_idx = self.region.index
+  def simple(self, region_index=None):
+    # *region_index* maps region ids to their index in Board.regions; computed here if not given.
+    if region_index is None:
+      region_index = {rid: idx for idx, rid in enumerate(self.board.state.live_regions())}
+    state = self.board.state
+    rid = state.find(self.id)
     return {
               'coords': self.coords,
               'color': self.color,
               'label': self.label,
-              'region_idx': region_idx,
-              'p_region_idxs': [region.index for region in self.potential_regions]
+              'region_idx': None if rid == NO_REGION else region_index[rid],
+              'p_region_idxs': [region_index[pr] for pr in sorted(state.potential_of(self.id))]
           }
 
 
 
 class Region:
+  # View of a region of a Board's GridState.
+  # Holds the id of any member; *id* resolves it to the region's current root, so a view stays valid through merges.
+  __slots__ = ('board', '_id')
+
   def __init__(self, board, color, *members, size_limit=INF):
+    assert members, "A region needs at least one member."
     assert all([member.color == color for member in members]), "Color mismatch."
-    self.color = color
-    self.size_limit = size_limit
-    self.members = set(members)
     self.board = board
-    self.origin = None  # set during build of the board
-    for member in members:
-      member.potential_regions.clear()
-      member.region = self
-    board.regions.add(self)
-    if self.is_master():
-      self.remote_parts = set()   # It's possible to know that a white region is part of an island without knowing how they're connected.
-                                  # They are modeled as separate regions: the master and the remote part.
+    self._id = board.state.new_region([member.id for member in members], NO_LIMIT if size_limit == INF else size_limit)
+    board._region_views[self._id] = self
+
+  @classmethod
+  def view(cls, board, rid):
+    region = object.__new__(cls)
+    region.board = board
+    region._id = rid
+    return region
 
   def __repr__(self):
     return f'<R:{self.color}:{self.size_limit} {sorted(self.members)}>'
 
+  def __eq__(self, other):
+    return isinstance(other, Region) and self.board is other.board and self.id == other.id
+
+  def __hash__(self):
+    return hash(self.id)
+
+  @property
+  def id(self):
+    return self.board.state.find(self._id)
+
+  @property
+  def color(self):
+    return self.board.state.color[self.id]
+
+  @property
+  def size_limit(self):
+    limit = self.board.state.size_limit[self.id]
+    return INF if limit == NO_LIMIT else limit
+
+  @property
+  def origin(self):
+    origin = self.board.state.origin[self.id]
+    return None if origin < 0 else self.board.state.coords(origin)
+
+  @origin.setter
+  def origin(self, coords):
+    state = self.board.state
+    state._write(state.origin, self.id, -1 if coords is None else state.cell_id(*coords))
+
+  @property
+  def member_ids(self):
+    return self.board.state.members(self.id)
+
+  @property
+  def members(self):
+    cell_list = self.board.cell_list
+    return {cell_list[i] for i in self.board.state.members(self.id)}
+
   @property
   def index(self):
-    return self.board.regions.index(self)
+    return self.board.state.live_regions().index(self.id)
 
   def is_done(self):
-    return self.size_limit == len(self.members)
+    return self.size_limit == self.board.state.count[self.id]
 
   def is_master(self):
-    return self.origin is not None
+    return self.board.state.origin[self.id] >= 0
 
   def simple(self):
     return {
+              'color': self.color,
               'size_limit': self.size_limit,
               'origin': self.origin
           }
@@ -93,21 +169,7 @@ class Region:
 
   def annex(self, other):
     # Merge *other* into *self*.
-    if self is other:
-      return
-    assert not self.is_master() or not other.is_master(), "Cannot merge two regions with defined size_limits."
-    assert self.color == other.color, "Cannot merge two regions of different colors."
-
-    self.members |= other.members
-    if other.is_master():
-      self.size_limit = other.size_limit
-    for cell in other.members:
-      cell.region = self
-      if self.color is white:
-        for nbor in [n for n in self.board.neighbors(cell) if n.color is unknown]:
-          nbor.potential_regions.discard(other)
-          nbor.potential_regions.add(self)
-    self.board.regions.discard(other)
+    self.board.state.annex(self.id, other.id)
 
 
 
@@ -119,11 +181,27 @@ class Region:
 
 class Board:
 
-  def __init__(self, board_list=None, jobj=None):
-    self.regions = OrderedSet()
-    self.cells = {}
-    self._width = None
-    self._height = None
+  def __init__(self, board_list=None, jobj=None, backend='object', workers=None):
+    # *backend* is 'object' to run the rules cell by cell, 'bitboard' to run them on bitmasks (see bitboard.py) or
+    # 'numpy' to run them on arrays, all islands at once (see vectorized.py).
+    # With *workers*, the 'object' rules work on many islands at once over that many processes (see parallel.py).
+    assert backend in BACKENDS, f"unknown backend {backend!r}"
+    assert workers is None or backend == 'object', "only the 'object' backend runs on worker processes"
+    if backend == 'numpy':
+      import vectorized
+      if vectorized.np is None:
+        raise ImportError("the 'numpy' backend needs NumPy")
+    self.backend = backend
+    self.workers = workers
+    self.state = None
+    self.cells = {}       # coords -> Cell
+    self.cell_list = []   # cell id -> Cell
+    self._region_views = {}
+    self._propagator = None
+    self.expansion_engine = EXPANSION_ENGINE
+    self.observer = None
+    self.call_counts = Counter()
+    self.interrupt = None   # callable polled between rules, raising propagation.Interrupted to stop solving
     if board_list is not None:
       self.build(board_list)
     elif jobj is not None:
@@ -131,23 +209,33 @@ class Board:
 
   @property
   def height(self):
-    if not self._height:
-      self._height = max([cell.y for cell in self.cells.values()])+1
-    return self._height
+    return self.state.height
 
   @property
   def width(self):
-    if not self._width:
-      self._width = max([cell.x for cell in self.cells.values()])+1
-    return self._width
+    return self.state.width
+
+  @property
+  def regions(self):
+    from ordered_set import OrderedSet
+    return OrderedSet([self.region_view(rid) for rid in self.state.live_regions()])
 
   @property
   def white_regions(self):
-    return OrderedSet([r for r in self.regions if r.color is white])
+    from ordered_set import OrderedSet
+    return OrderedSet([self.region_view(rid) for rid in self.state.live_regions(white)])
 
   @property
   def black_regions(self):
-    return OrderedSet([r for r in self.regions if r.color is black])
+    from ordered_set import OrderedSet
+    return OrderedSet([self.region_view(rid) for rid in self.state.live_regions(black)])
+
+  def region_view(self, rid):
+    try:
+      return self._region_views[rid]
+    except KeyError:
+      region = self._region_views[rid] = Region.view(self, rid)
+      return region
 
   def __str__(self):
     return '\n'.join([str(row) for row in self.get_list_form()])
@@ -156,20 +244,76 @@ class Board:
     return self.get_list_form() == other.get_list_form()
 
   def copy(self):
-    return deepcopy(self)
+    # Independent Board over a snapshot of this one's state, safe to hand to another thread.
+    board = Board(backend=self.backend, workers=self.workers)
+    board._attach(self.state.snapshot())
+    return board
+
+  def checkpoint(self):
+    # Return a token that rollback() can restore this board to.
+    return self.state.checkpoint()
+
+  def rollback(self, token):
+    # Undo every set_color/annex made since checkpoint() returned *token*. Takes time proportional to the changes.
+    self.state.rollback(token)
+    return self
+
+  def commit(self):
+    # Keep all changes and drop every open checkpoint.
+    self.state.commit()
+    return self
 
   def get_list_form(self):
-    return [ [self.cells[(x,y)].color for x in range(self.width)] for y in range(self.height) ]
+    color, w = self.state.color, self.width
+    return [ list(color[y*w:(y+1)*w]) for y in range(self.height) ]
+
+  def get_clue_form(self):
+    # The clue grid the board was built from, 0 for cells without a clue.
+    label, w = self.state.label, self.width
+    return [ [max(n, 0) for n in label[y*w:(y+1)*w]] for y in range(self.height) ]
+
+  def paint_solution(self, colors):
+    # Paint every unknown cell the color it has in *colors*, a grid like get_list_form(). Unknown there stays unknown.
+    cell_list, color = self.cell_list, self.state.color
+    wanted = [c for row in colors for c in row]
+    for c in (white, black):
+      self.set_color(c, *(cell_list[i] for i, want in enumerate(wanted) if want == c and color[i] == unknown))
+    return self
+
+  def solve_from_cache(self, cache):
+    # Paint in the solution *cache* (see cache.py) has for this board's clues. Returns whether it had one that holds up.
+    solution = cache.get(self.get_clue_form())
+    if solution is None:
+      return False
+    owns_trail = self.state.trail is None    # as in backtrack, leave a caller's checkpoints open
+    token = self.checkpoint()
+    try:
+      found = self.paint_solution(solution).is_solved() and self.find_contradiction() is None
+    except Contradiction:
+      found = False
+    if not found:
+      self.rollback(token)
+    if owns_trail:
+      self.commit()
+    return found
 
   def show(self, title="Nurikabe Board"):
+    from board_display import show_board
     show_board(self, title)
     return self
 
+  def render(self, format='text'):
+    # The board drawn as 'text', 'ansi' or 'svg', without a display or a copy (see render.py).
+    from render import Picture, RENDERERS
+    return RENDERERS[format](Picture.of_board(self))
+
 
   def simple(self):
+    live = self.state.live_regions()
+    region_index = {rid: idx for idx, rid in enumerate(live)}
     return {
-              'regions': [region.simple() for region in self.regions],
-              'cells': [cell.simple() for cell in self.cells.values()]
+              'regions': [self.region_view(rid).simple() for rid in live],
+              'cells': [cell.simple(region_index) for cell in self.cell_list]
           }
 
   def dump(self, filename=LAST_BOARD_FILE):
@@ -178,47 +322,63 @@ class Board:
     return self
 
 
+  def _init_state(self, width, height):
+    self._attach(GridState(width, height))
+
+  def _attach(self, state):
+    self.state = state
+    self.cell_list = [Cell(self, i) for i in range(self.state.size)]
+    self.cells = {cell.coords: cell for cell in self.cell_list}
+    self._region_views = {}
 
   def build(self, grid):
     # Build out model of a new Nurikabe board.
+    self._init_state(len(grid[0]), len(grid))
+    state = self.state
     for y, row in enumerate(grid):
       for x, size_limit in enumerate(row):
-        if size_limit == 0:
-          self.cells[(x,y)] = Cell(x, y, 0)
-        else:
-          newCell = Cell(x, y, 1, label=size_limit)
-          newRegion = Region(self, 1, newCell, size_limit=size_limit)
-          newRegion.origin = (x,y)
-          self.cells[(x,y)] = newCell
-          self.regions.add(newRegion)
-    for region in self.white_regions:
-      for cell in region.members:
-        for nbor in [n for n in self.neighbors(cell) if n.color is unknown]:
-          nbor.potential_regions.add(region)
+        if size_limit != 0:
+          i = state.cell_id(x, y)
+          state.color[i] = white
+          state.label[i] = size_limit
+          state.new_region((i,), size_limit, origin=i)
+    for rid in state.live_regions(white):
+      for n in state.nbors[rid]:
+        if state.color[n] == unknown:
+          state.add_potential(n, rid)
     return self
 
   def rebuild(self, jobj):
     # Build out model with saved JSON object.
-    self.regions = OrderedSet()
-    for region in jobj['regions']:
-      new_region = Region(self, region['color'], size_limit=region['size_limit'])
-      new_region.board = self
-      new_region.origin = region['origin']
-      self.regions.add(new_region)
-
+    coords = [tuple(cell['coords']) for cell in jobj['cells']]
+    self._init_state(max(x for x, _ in coords)+1, max(y for _, y in coords)+1)
+    state = self.state
+    units = [[] for _ in jobj['regions']]
     for cell in jobj['cells']:
-      new_cell = Cell(*cell['coords'], cell['color'], cell['label'])
+      i = state.cell_id(*cell['coords'])
+      state.color[i] = cell['color']
+      if cell['label'] == u"\u2022":
+        state.label[i] = BULLET
+      elif cell['label']:
+        state.label[i] = int(cell['label'])
       if cell['region_idx'] is not None:
-        new_cell.region = self.regions[cell['region_idx']]
-        new_cell.region.members.add(new_cell)
-      new_cell.potential_regions = {self.regions[pri] for pri in cell['p_region_idxs']}
-      self.cells[new_cell.coords] = new_cell
+        units[cell['region_idx']].append(i)
+
+    rids = []
+    for region, unit in zip(jobj['regions'], units):
+      origin = -1 if region['origin'] is None else state.cell_id(*region['origin'])
+      size_limit = NO_LIMIT if region['size_limit'] == INF else region['size_limit']
+      rids.append(state.new_region(unit, size_limit, origin) if unit else None)
+
+    for cell in jobj['cells']:
+      for pri in cell['p_region_idxs']:
+        state.add_potential(state.cell_id(*cell['coords']), rids[pri])
 
     return self
   
 
   def is_solved(self):
-    return all([cell.color for cell in self.cells.values()])
+    return all(self.state.color)
 
 
 
@@ -237,45 +397,29 @@ class Board:
     assert all((cell.color is unknown for cell in cells)), f"Can only set unknown cells. {[cell for cell in cells if cell.color is not unknown]}"
     assert color is not unknown, "Can only set color to be black or white."
 
-    for cell in cells:
-      cell.color = color
-      cell.potential_regions.clear()
-      if color is white:
-        cell.label = u"\u2022" # bullet
-
-    for unit in self.gather(cells):
-      new_region = Region(self, color, *unit)
-      self.regions.add(new_region)
-      if color is white:
-        for nbor in self.group_neighbors(unit):
-          if nbor.color is unknown:
-            nbor.potential_regions.add(new_region)
-      for nbor in self.group_neighbors(unit):
-        if nbor.region is not None and nbor.color == color:
-          new_region.annex(nbor.region)
+    self.state.paint([cell.id for cell in cells], color)
 
   def neighbors(self, cell, d=1):
     # Get set of Cells that are at most taxicab distance *d* away from *cell*.
     # Excludes *cell*.
-    if d<1:
-      return set()
-    coords = {(cell.x+(n1*(d-i)), cell.y+(n2*i)) for i in range(d+1) for n1 in (1,-1) for n2 in (1,-1)}
-    nbors = {self.cells[pos] for pos in coords if 0<=pos[0]<self.width and 0<=pos[1]<self.height}
-    return nbors | self.neighbors(cell, d=d-1)
+    cell_list = self.cell_list
+    return {cell_list[n] for n in self.state.geometry.ball(d)[cell.id]}
 
   def group_neighbors(self, group, d=1):
     # Get set of Cells that are at most taxicab distance *d* away from a Cell in *group*.
     # Excludes Cells in *group*.
-    return set.union(*(self.neighbors(cell, d=d) for cell in group)) - group
+    cell_list, ball = self.cell_list, self.state.geometry.ball(d)
+    return {cell_list[n] for cell in group for n in ball[cell.id]} - group
+
+  def _group_neighbor_ids(self, unit):
+    # Ids of cells orthogonally adjacent to a Cell id in *unit*, excluding *unit*.
+    nbors = self.state.nbors
+    return {n for i in unit for n in nbors[i]}.difference(unit)
 
   def squares(self, cell):
-    # Return the sets of Cells that make up the four 2x2 squares that include *cell*
-    return [
-            {cell, self.cells[(cell.x, cell.y+1)], self.cells[(cell.x+1, cell.y)], self.cells[(cell.x+1, cell.y+1)]},
-            {cell, self.cells[(cell.x, cell.y+1)], self.cells[(cell.x-1, cell.y)], self.cells[(cell.x-1, cell.y+1)]},
-            {cell, self.cells[(cell.x, cell.y-1)], self.cells[(cell.x+1, cell.y)], self.cells[(cell.x+1, cell.y-1)]},
-            {cell, self.cells[(cell.x, cell.y-1)], self.cells[(cell.x-1, cell.y)], self.cells[(cell.x-1, cell.y-1)]},
-          ]
+    # Return the sets of Cells that make up the in-bounds 2x2 squares that include *cell*
+    cell_list = self.cell_list
+    return [{cell_list[i] for i in square} for square in self.state.geometry.cell_squares[cell.id]]
 
   def find_pathtree(self, start_unit, region=None, end_unit=None, size_limit=None, color=None):
     if type(start_unit) is Cell:
@@ -291,7 +435,7 @@ class Board:
     elif type(end_unit) is Region:
       end_unit = end_unit.members
     else:
-      end_unit = set(end_unit)
+      end_unit = set(end_unit or ())
 
     if size_limit is None:
       if region is not None:
@@ -300,102 +444,186 @@ class Board:
         size_limit = INF
 
     if color is None:
-      color = list(start_unit[0]).color    # color of arbitrary Cell in *start_unit*
+      color = next(iter(start_unit)).color    # color of arbitrary Cell in *start_unit*
 
     if color is white:
-      return self._find_pathtree_white(start_unit, set(), region, end_unit, size_limit-len(start_unit))
-
-
-  def _find_pathtree_white(self, start_unit, used, region, end_unit, allowance):
-    pt = Pathtree(start_unit)
-    if start_unit&end_unit is not set() or allowance<=0:
-      return pt
-
-    used = used | start_unit
-    nbors = {nbor for nbor in self.group_neighbors(start_unit) if nbor not in used and nbor.color is not black}
-    for nbor in nbors:
-      new_unit = set.union({nbor}, *(pr.members for pr in nbor.potential_regions-{region}))
-      if len(new_unit) <= allowance:
-        pt.add_kid(self._find_pathtree_white(new_unit, used, region, end_unit, allowance-len(new_unit)))
-
-    return pt
-
-  def _find_pathtree_black(self, start_unit, used, end_unit):
-    pt = Pathtree(start_unit)
-    if start_unit&end_unit is not set():
-      return pt
-
-    used = used | start_unit
-    nbors = {nbor for nbor in self.group_neighbors(start_unit) if nbor not in used}
-    for nbor in nbors:
-      if nbor.color is white:
-        continue
-      elif nbor.color is unknown and any( [all([cell.color is black or (cell in used) for cell in square-{nbor}]) for square in self.squares(nbor)] ):    # If it is the last unknown cell in a 2x2 square of black or already used cells
+      return self._find_pathtree_white(start_unit, region, end_unit, size_limit-len(start_unit))
+    return self._find_pathtree_black(start_unit, end_unit)
+
+  def _grow_pathtree(self, start_unit, end_unit, allowance, kid_units):
+    # Depth-first, with an explicit stack, build the Pathtree of the paths from *start_unit* that end in *end_unit*, run
+    # out of *allowance* or can't go on. *kid_units(unit_ids, used, allowance)* gives (unit ids, allowance left) for the
+    # kids of a node; *used* counts, by cell id, the units on the current path that hold the cell, and is shared by the
+    # whole walk.
+    used = bytearray(self.state.size)
+    end_ids = {cell.id for cell in end_unit}
+    cell_list = self.cell_list
+    root_ids = frozenset(cell.id for cell in start_unit)
+    root = Pathtree(start_unit)
+    stack = []
+
+    def enter(node, unit_ids, allowance):
+      for i in unit_ids:
+        used[i] += 1
+      kids = () if not end_ids.isdisjoint(unit_ids) or allowance <= 0 else kid_units(unit_ids, used, allowance)
+      stack.append((node, unit_ids, iter(kids)))
+
+    enter(root, root_ids, allowance)
+    while stack:
+      node, unit_ids, kids = stack[-1]
+      for kid_ids, allowance in kids:
+        kid_unit = frozenset(cell_list[i] for i in kid_ids)
+        if kid_unit not in node.kid_units:
+          enter(node.kid(kid_unit), kid_ids, allowance)
+          break
+      else:
+        stack.pop()
+        for i in unit_ids:
+          used[i] -= 1
+    return root
+
+  def _find_pathtree_white(self, start_unit, region, end_unit, allowance):
+    state = self.state
+    color, nbors, members, potential_of = state.color, state.nbors, state.members, state.potential_of
+    rid = NO_REGION if region is None else region.id
+
+    def kid_units(unit_ids, used, left):
+      found = []
+      for n in sorted({n for i in unit_ids for n in nbors[i]}):
+        if used[n] or color[n] == black:
           continue
-      pt.add_kid(self._find_pathtree_black({nbor}, used, end_unit))
-
-    return pt
+        new_unit = frozenset().union((n,), *(members(r) for r in potential_of(n) - {rid}))
+        if len(new_unit) <= left:
+          found.append((new_unit, left - len(new_unit)))
+      return found
+    return self._grow_pathtree(start_unit, end_unit, allowance, kid_units)
+
+  def _find_pathtree_black(self, start_unit, end_unit):
+    state = self.state
+    color, nbors, cell_squares = state.color, state.nbors, state.geometry.cell_squares
+
+    def kid_units(unit_ids, used, allowance):
+      found = []
+      for n in sorted({n for i in unit_ids for n in nbors[i]}):
+        if used[n] or color[n] == white:
+          continue
+        # If it is the last unknown cell in a 2x2 square of black or already used cells
+        if color[n] == unknown and any(all(color[c] == black or used[c] for c in square if c != n) for square in cell_squares[n]):
+          continue
+        found.append((frozenset((n,)), allowance))
+      return found
+    return self._grow_pathtree(start_unit, end_unit, INF, kid_units)
 
   def find_expansions_white(self, region):
     # Return a list of all possible expansions of *region*.
+    cell_list = self.cell_list
+    return [{cell_list[i] for i in exp} for exp in self._expansion_ids(region.id)]
+
+  def _expansion_ids(self, rid):
+    state = self.state
+    color, members, potential_of, borders_other_island = state.color, state.members, state.potential_of, state.borders_other_island
+    size_limit = state.size_limit[rid]
     complete_exps = set()
-    partial_exps = UniqueQueue([frozenset(region.members)])
+    from uniquequeue import UniqueQueue
+    partial_exps = UniqueQueue([frozenset(members(rid))])
 
     while partial_exps:
       current = partial_exps.pop()
-      if len(current) == region.size_limit:
+      if len(current) == size_limit:
         complete_exps.add(current)
       else:
-        for nbor in self.group_neighbors(current):
-          potential_regions = nbor.potential_regions-{region}
-          if nbor.color is not black and not any([pr.is_master() for pr in potential_regions]):
-            nbor_unit = set.union({nbor}, *(pr.members for pr in potential_regions))
-            if len(nbor_unit) + len(current) <= region.size_limit:
-              partial_exps.push(current|nbor_unit)
-
-    return [set(exp) for exp in complete_exps]
+        for nbor in self._group_neighbor_ids(current):
+          if color[nbor] == unknown and not borders_other_island(nbor, rid):
+            if len(current) + state.annexed_size(nbor, rid, current) <= size_limit:
+              partial_exps.push(current.union((nbor,), *(members(pr) for pr in potential_of(nbor)-{rid})))
+
+    return complete_exps
             
 
 
   def gather(self, collection):
     # Group a collection of cells into contiguous sets.
-    collection = list(collection)
+    cell_list = self.cell_list
+    return [{cell_list[i] for i in c_set} for c_set in self._gather_ids([cell.id for cell in collection])]
+
+  def _gather_ids(self, ids):
+    # Group a collection of cell ids into contiguous sets.
+    nbors = self.state.nbors
+    remaining = set(ids)
     c_sets = []
-    while collection:
+    while remaining:
       c_set = set()
-      to_process = {collection.pop()}
+      to_process = [remaining.pop()]
       while to_process:
         current = to_process.pop()
         c_set.add(current)
-        for nbor in [n for n in self.neighbors(current) if n in collection and n not in c_set]:
-          to_process.add(nbor)
+        for nbor in nbors[current]:
+          if nbor in remaining:
+            remaining.discard(nbor)
+            to_process.append(nbor)
       c_sets.append(c_set)
     return c_sets
 
 
-  def find_reach_white(self, region, open_layer=None, used=None, depth=0, depth_limit=None):
+  def find_reach_white(self, region, depth_limit=None):
     # Find the reach of *region* to *depth_limit* by adding successive shells of possible cells.
     # Returns set of all Cells that could belong to Region.
     # Should be faster than find_pathtree().union()
-    if open_layer is None:
-      open_layer = {cell:len(region.members) for cell in set(region.members)}   # the *min_req_size* for *cell* is the number of cells it would take to connect *region* to *cell*, including itself and the cells already in *region*
-    if used is None:
-      used = set()
+    cell_list = self.cell_list
+    return {cell_list[i] for i in self._reach_ids(region.id, depth_limit)}
+
+  def _reach_ids(self, rid, depth_limit=None):
+    if self.backend == 'bitboard':
+      return set(ids(reach_mask(self, Bitboard(self.state), rid, depth_limit)))
+    if self.backend == 'numpy':
+      import vectorized
+      return set(vectorized.reach_cells(self, [rid], depth_limit)[0].tolist())
+    return set().union(*self._reach_layers(rid, depth_limit))
+
+  def _reach_layers(self, rid, depth_limit=None, known=None, restart=0):
+    # Return the successive shells of cells *rid* can reach as dicts mapping each cell id to its *min_req_size*,
+    # the number of cells it would take to connect the region to it, including itself and the cells already in the region.
+    # Given the shells *known* from an earlier call, keeps the ones before shell *restart* and recomputes the rest.
+    state = self.state
+    color, members, potential_of, nbors, find = state.color, state.members, state.potential_of, state.nbors, state.find
+    borders_other_island, annexed_size = state.borders_other_island, state.annexed_size
+    size_limit = state.size_limit[rid]
+    own = frozenset((rid,))
     if depth_limit is None:
-      depth_limit = region.size_limit - len(region.members)
-    if depth >= depth_limit:
-      return used|set(open_layer)
+      depth_limit = size_limit - state.count[rid]
+    if known is None or restart < 1:
+      layers = [dict.fromkeys(members(rid), state.count[rid])]
     else:
+      layers = known[:restart]
+    used = set().union(*layers[:-1])
+    open_layer = layers[-1]
+    # White regions without a clue already annexed on the way here aren't counted again when a later cell borders them
+    # too, so that min_req_size never overshoots (which would make reachable cells look unreachable).
+    annexed = {find(c) for layer in layers for c in layer if color[c] == white} - {rid}
+    for _ in range(len(layers)-1, depth_limit):
       next_open = {}
       for cell, min_req_size in open_layer.items():
-        for nbor in [n for n in self.neighbors(cell) if n not in set(next_open)|set(open_layer)|used]:    # nbors that haven't already been accounted for
-          if nbor.color is unknown and not any([r.is_master() for r in nbor.potential_regions-{region}]):  # if nbor isn't adjacent to any other regions with defined size_limit (i.e. a separate island)
-            connected_cells = {cell for r in nbor.potential_regions-{region} for cell in r.members}|{nbor}
-            if len(connected_cells) + min_req_size <= region.size_limit:                          # if this region can annex all regions adjacent to *nbor* w/o violating its size_limit
-              for cell in connected_cells:
-                next_open[cell] = min(next_open.get(cell, INF), min_req_size+len(connected_cells))
+        for nbor in nbors[cell]:
+          if nbor in next_open or nbor in open_layer or nbor in used:   # nbors that have already been accounted for
+            continue
+          if color[nbor] != unknown or borders_other_island(nbor, rid):    # taking nbor in would merge rid with another island
+            continue
+          potential = potential_of(nbor)
+          if potential <= own:    # nbor borders no other white region, the usual case
+            if min_req_size < size_limit:
+              next_open[nbor] = min_req_size+1
+            continue
+          req_size = min_req_size + annexed_size(nbor, rid, annexed)
+          if req_size <= size_limit:    # if this region can annex all regions adjacent to *nbor* w/o violating its size_limit
+            others = potential-own-annexed
+            for c in chain((nbor,), *(members(r) for r in others)):
+              next_open[c] = min(next_open.get(c, INF), req_size)
+            annexed.update(others)
       used.update(open_layer)
-      return self.find_reach_white(region, next_open, used, depth+1, depth_limit)
+      open_layer = next_open
+      layers.append(next_open)
+    return layers
+
 
 
 
@@ -404,6 +632,44 @@ class Board:
 
 
 
+  def find_contradiction(self):
+    # Return a description of the first rule the board breaks, or None if it could still be solved.
+    if self.backend != 'object':
+      return find_contradiction_bitwise(self)
+    state = self.state
+    color = state.color
+    for square in state.geometry.squares:
+      if all(color[i] == black for i in square):
+        return f"pool at {state.coords(square[0])}"
+
+    reachable = bytearray(state.size)
+    for rid in state.live_regions(white):
+      if state.origin[rid] >= 0:
+        if state.count[rid] > state.size_limit[rid]:
+          return f"oversize island at {state.coords(state.origin[rid])}"
+        reach = self._reach_ids(rid)
+        if len(reach) < state.size_limit[rid]:
+          return f"island at {state.coords(state.origin[rid])} can't reach its size"
+        for i in reach:
+          reachable[i] = 1
+    for rid in state.live_regions(white):
+      if not reachable[rid]:
+        return f"white region at {state.coords(rid)} can't reach an island"
+
+    blacks = [i for i in range(state.size) if color[i] == black]
+    if blacks:
+      seen = {blacks[0]}
+      to_process = [blacks[0]]
+      while to_process:
+        for n in state.nbors[to_process.pop()]:
+          if n not in seen and color[n] != white:
+            seen.add(n)
+            to_process.append(n)
+      if not seen.issuperset(blacks):
+        return "black is disconnected"
+    return None
+
+
 
   # INFERENCES
 
@@ -431,50 +697,145 @@ class Board:
 
   def find_unreachable(self):
     # Set all Cells that can't be reached by any islands to black.
-    reachable = set()
-    for region in [r for r in self.white_regions if r.is_master()]:
-      reachable.update(self.find_reach_white(region))
-    unreachable = [cell for cell in set(self.cells.values())-reachable if cell.color is unknown]
+    state = self.state
+    if self.backend == 'bitboard':
+      bitboard, reached = Bitboard(state), 0
+      for rid in bitboard.islands:
+        reached |= reach_mask(self, bitboard, rid)
+      unreachable = [self.cell_list[i] for i in ids(bitboard.unknown & ~reached)]
+      self.set_color(2, *unreachable)
+      return [cell.coords for cell in unreachable]
+    if self.backend == 'numpy':
+      import vectorized
+      unreachable = vectorized.colors(state).ravel() == unknown
+      for cells in vectorized.reach_cells(self, [rid for rid in state.live_regions(white) if state.origin[rid] >= 0]):
+        unreachable[cells] = False
+      unreachable = [self.cell_list[i] for i in vectorized.np.flatnonzero(unreachable).tolist()]
+      self.set_color(2, *unreachable)
+      return [cell.coords for cell in unreachable]
+    reachable = bytearray(state.size)
+    for rid in state.live_regions(white):
+      if state.origin[rid] >= 0:
+        for i in self._reach_ids(rid):
+          reachable[i] = 1
+    unreachable = [self.cell_list[i] for i in range(state.size) if not reachable[i] and state.color[i] == unknown]
     self.set_color(2, *unreachable)
     return [cell.coords for cell in unreachable]
 
   def prevent_pools(self):
     # Find any unknown Cells that are part of a 2x2 square where the other Cells are black and set them to white.
+    if self.backend == 'bitboard':
+      cells = [self.cell_list[i] for i in ids(Bitboard(self.state).pool_breakers())]
+      self.set_color(white, *cells)
+      return [cell.coords for cell in cells]
+    if self.backend == 'numpy':
+      import vectorized
+      cells = [self.cell_list[i] for i in vectorized.pool_breakers(self.state)]
+      self.set_color(white, *cells)
+      return [cell.coords for cell in cells]
+    color = self.state.color
     changes = []
-    for x in range(self.width-1):
-      for y in range(self.height-1):
-        square = {self.cells[(x, y)], self.cells[(x, y+1)], self.cells[(x+1, y)], self.cells[(x+1, y+1)]}
-        nonblack = [cell for cell in square if cell.color is not black]
-        if len(nonblack) == 1 and nonblack[0].color is unknown:
-          self.set_color(white, nonblack[0])
-          changes.append(nonblack[0].coords)
+    for square in self.state.geometry.squares:
+      nonblack = [c for c in square if color[c] != black]
+      if len(nonblack) == 1 and color[nonblack[0]] == unknown:
+        cell = self.cell_list[nonblack[0]]
+        self.set_color(white, cell)
+        changes.append(cell.coords)
     return changes
 
+  def connect_black(self):
+    # Set the unknown Cells whose turning white would disconnect black to black.
+    cells = [self.cell_list[i] for i in black_cut_cells(self.state)]
+    self.set_color(black, *cells)
+    return [cell.coords for cell in cells]
+
+  def force_exits(self):
+    # Give the only unknown neighbor of every region that must still grow that region's color.
+    to_white, to_black = single_exits(self.state)
+    cells = [self.cell_list[i] for i in to_white + to_black]
+    self.set_color(white, *cells[:len(to_white)])
+    self.set_color(black, *cells[len(to_white):])
+    return [cell.coords for cell in cells]
+
   def expand_white(self):
     # Calculate all the ways that each white island can expand to their size_limit, and then find any Cells that they all have in common and set those to white.
     changes = []
     for region in [r for r in self.white_regions if r.is_master()]:
-      if expansions := self.find_expansions_white(region):
-        if intersection := {cell for cell in set.intersection(*expansions) if cell.color is unknown}:
-          self.set_color(1, *(cell for cell in intersection))
-          changes.append([cell.coords for cell in intersection])
+      if intersection := self._expansion_commons(region.id):
+        self.set_color(1, *intersection)
+        changes.append([cell.coords for cell in intersection])
     return changes
 
+  def _expansion_commons(self, rid):
+    # Unknown Cells that are in every expansion of island *rid*. Empty if the expansion engine is inconclusive.
+    common = self.expansion_engine.common_cells(self.state, rid)
+    return [self.cell_list[i] for i in sorted(common or ())]
+
+
+  @property
+  def propagator(self):
+    if self._propagator is None or self._propagator.state is not self.state:
+      if self.workers:
+        self._propagator = ParallelPropagator(self, self.workers)
+      elif self.backend == 'numpy':
+        import vectorized
+        self._propagator = vectorized.NumpyPropagator(self)
+      else:
+        self._propagator = {'object': Propagator, 'bitboard': BitboardPropagator}[self.backend](self)
+    return self._propagator
 
-  def solve(self):
-    cycles = len(self.cells)+5
-    for _ in range(cycles):
-      self.find_unreachable()
-      self.prevent_pools()
-      self.expand_white()
-      if self.is_solved():
-        break
+  def propagate(self):
+    # Apply the inference rules until none of them changes the board, re-running them only where it changed.
+    self.propagator.run()
+    return self
+
+  def observe(self, observer):
+    # Report solve progress to *observer* (see instrument.py) and count calls to the neighborhood and reach helpers.
+    # None detaches it.
+    self.observer = observer
+    self.call_counts.clear()
+    for name in COUNTED_CALLS:
+      if observer is None:
+        self.__dict__.pop(name, None)
+      else:
+        setattr(self, name, count_calls(self, name))
+    return self
+
+  def solve(self, search=False, node_limit=None, time_limit=None, cache=None):
+    # With *search*, fall back to backtracking (see backtrack.py) if the inference rules stall. With a SolutionCache
+    # *cache* (see cache.py), look the solution up there first and store it there once solved.
+    observer = self.observer
+    start = perf_counter()
+    if observer is not None:
+      observer.solve_start(self)
+    cycles = 0
+    if cache is not None and self.solve_from_cache(cache):
+      status = 'solved'
+      print("Solved from cache.")
+      if observer is not None:
+        observer.solve_end(self, start, perf_counter()-start, cycles, status)
+      return self
+    cycles = self.propagator.run()
+    if self.is_solved():
+      status = 'solved'
+      print(f"Solved in {cycles} cycles.")
+    elif search:
+      search_start = perf_counter()
+      self.search_stats = backtrack(self, node_limit, time_limit)
+      if observer is not None:
+        observer.search(self, search_start, perf_counter()-search_start, self.search_stats)
+      status = self.search_stats.status
+      if status == 'solved':
+        print(f"Solved by search after {cycles} cycles: {self.search_stats}")
     else:
+      status = 'unsolved'
+    if status != 'solved':
       print(f"Unsolved after {cycles} cycles.")
       self.dump()
-      return self
-
-    print(f"Solved in {cycles} cycles.")
+    elif cache is not None:
+      cache.put(self.get_clue_form(), self.get_list_form())
+    if observer is not None:
+      observer.solve_end(self, start, perf_counter()-start, cycles, status)
     return self
 
  
@@ -489,10 +850,8 @@ def main():
         [3, 0, 0, 0, 0]
       ]
 
-  with open('puzzles.json', 'r') as read_file:
-    boards = [Board(b) for b in json.loads(read_file.read())]
-
-  b = boards[0]
+  _, first = next(read_stream('puzzles.json'))
+  b = Board(first)
   
   b.solve().show()
 
@@ -1,5 +1,5 @@
-import tkinter as tk
-import threading
+# tkinter and threading are imported when a window is opened, so the layout constants can be used on hosts without Tk
+# (see render.py).
 
 CELL_SIDE = 55
 
@@ -9,6 +9,7 @@ COORDS = True
 
 class Board_Display:
     def __init__(self, master, board, title):
+        import tkinter as tk
         self.master = master
         master.title(title)
 
@@ -56,11 +57,13 @@ class Board_Display:
 
 
 def show_board(board, title):
+    import threading
     board_copy = board.copy()
     th = threading.Thread(target=_show_board, args=(board_copy, title))
     th.start()
 
 def _show_board(board, title):
+    import tkinter as tk
     window = tk.Tk()
     Board_Display(window, board, title)
     window.mainloop()
@@ -1,34 +1,22 @@
 import pytest
 from board import *
+from expansion import ExpansionEngine
 
 @pytest.fixture
 def BOARD():
     return Board()
 
-@ pytest.fixture
-def GRID_1():
-    b = Board(
-                [
-                    [0, 0, 0, 0, 0],
-                    [0, 0, 0, 0, 0],
-                    [3, 0, 0, 2, 0],
-                    [0, 0, 0, 0, 1],
-                    [3, 0, 0, 0, 0]
-                ]
-              )
-    return b
+@pytest.fixture
+def GRID_1(GRID_1_LIST):
+    return Board(GRID_1_LIST)
 
 @pytest.fixture
-def SOL_1():
-    b = Board(manual_list=
-                    [
-                        [2, 2, 2, 2, 2],
-                        [2, 1, 2, 1, 2],
-                        [1, 1, 2, 1, 2],
-                        [2, 2, 2, 2, 1],
-                        [1, 1, 1, 2, 2]
-                    ]
-                  )
+def SOL_1(GRID_1_LIST, SOL_1_LIST):
+    b = Board(GRID_1_LIST)
+    for y, row in enumerate(SOL_1_LIST):
+        for x, color in enumerate(row):
+            if b.cells[(x,y)].color == 0:
+                b.set_color(color, b.cells[(x,y)])
     return b
 
 @pytest.fixture
@@ -54,13 +42,257 @@ def test_is_solved_false(GRID_1):
 
 def test_find_reach_white(GRID_2):
     result = {(1,4), (2,3), (2,4), (3,2), (3,3), (3,4), (4,3)}
-    region = [r for r in GRID_2.white_regions if r.size == 3][0] #the only region of size 3
+    region = [r for r in GRID_2.white_regions if r.size_limit == 3][0] #the only region of size 3
     assert {cell.coords for cell in GRID_2.find_reach_white(region)} == result, "find_reach_white failed"
 
 
 def test_find_unreachable(GRID_1, SOL_1):
+    changes = GRID_1.find_unreachable()
+    assert changes, "find_unreachable found nothing"
+    assert all(SOL_1.cells[coords].color == 2 for coords in changes), "find_unreachable failed"
+
+
+
+
+
+def test_neighbors(GRID_2):
+    result = {(0,2), (1,1), (1,3), (2,2), (1,0), (0,1), (2,1), (0,3), (2,3), (1,4), (3,2)}
+    assert {cell.coords for cell in GRID_2.neighbors(GRID_2.cells[(1,2)], d=2)} == result, "neighbors failed"
+
+
+def test_squares_in_bounds(GRID_2):
+    assert [{cell.coords for cell in sq} for sq in GRID_2.squares(GRID_2.cells[(0,0)])] == [{(0,0), (1,0), (0,1), (1,1)}], "squares corner failed"
+    assert len(GRID_2.squares(GRID_2.cells[(2,4)])) == 2, "squares edge failed"
+    assert len(GRID_2.squares(GRID_2.cells[(2,2)])) == 4, "squares interior failed"
+
+
+def test_set_color_merges_regions(GRID_2):
+    GRID_2.set_color(2, GRID_2.cells[(0,0)], GRID_2.cells[(2,0)])
+    assert len(GRID_2.black_regions) == 2, "set_color made wrong number of regions"
+    GRID_2.set_color(2, GRID_2.cells[(1,0)])
+    assert len(GRID_2.black_regions) == 1, "set_color didn't merge regions"
+    assert GRID_2.cells[(0,0)].region == GRID_2.cells[(2,0)].region, "merged region views differ"
+
+
+def test_dump_rebuild(GRID_1):
     GRID_1.find_unreachable()
-    assert GRID_1 == SOL_1, "find_unreachable failed"
+    jobj = json.loads(json.dumps(GRID_1.simple()))
+    rebuilt = Board(jobj=jobj)
+    assert rebuilt == GRID_1, "rebuild changed colors"
+    assert json.loads(json.dumps(rebuilt.simple())) == jobj, "rebuild changed regions"
+
+
+def test_rollback(GRID_1):
+    before = GRID_1.simple()
+    token = GRID_1.checkpoint()
+    GRID_1.set_color(1, GRID_1.cells[(1,2)])
+    GRID_1.set_color(2, GRID_1.cells[(0,3)], GRID_1.cells[(1,3)])
+    GRID_1.rollback(token)
+    assert GRID_1.simple() == before, "rollback failed"
+
+
+def check_adjacency(board):
+    state = board.state
+    for rid in state.live_regions(white):
+        bordered = {n for i in state.members(rid) for n in state.nbors[i] if state.color[n] == unknown}
+        assert state.frontier_of(rid) == bordered, f"frontier of {state.coords(rid)} wrong"
+    for i in range(state.size):
+        if state.color[i] == unknown:
+            islands = {state.origin[r] for r in state.potential_of(i) if state.origin[r] >= 0}
+            for rid in state.live_regions(white):
+                assert state.borders_other_island(i, rid) == bool(islands - {state.origin[rid]}), "masters wrong"
+            assert state.annexed_size(i, NO_REGION) == 1 + sum(state.count[r] for r in state.potential_of(i)), "annexed_size wrong"
+
+
+def test_adjacency_follows_paint_and_rollback(GRID_3):
+    check_adjacency(GRID_3)
+    token = GRID_3.checkpoint()
+    GRID_3.set_color(1, GRID_3.cells[(5,4)], GRID_3.cells[(5,5)])
+    check_adjacency(GRID_3)
+    GRID_3.set_color(1, GRID_3.cells[(4,4)])    # merges the clueless pair into the 2 at (3,4)
+    check_adjacency(GRID_3)
+    GRID_3.rollback(token)
+    check_adjacency(GRID_3)
+    GRID_3.propagate()
+    check_adjacency(GRID_3)
+    check_adjacency(Board(jobj=json.loads(json.dumps(GRID_3.simple()))))
+
+
+def test_copy_is_independent(GRID_1):
+    board_copy = GRID_1.copy()
+    board_copy.find_unreachable()
+    assert board_copy != GRID_1, "copy shares state"
+
+
+@pytest.fixture
+def GRID_3():
+    b = Board(
+                [
+                    [0, 1, 0, 0, 0, 0],
+                    [0, 0, 0, 1, 0, 1],
+                    [2, 0, 1, 0, 1, 0],
+                    [0, 0, 0, 0, 0, 0],
+                    [0, 1, 0, 2, 0, 0],
+                    [0, 0, 0, 0, 0, 0]
+                ]
+            )
+    return b
+
+
+def test_find_contradiction(GRID_1):
+    assert GRID_1.find_contradiction() is None, "false contradiction"
+    GRID_1.set_color(2, GRID_1.cells[(0,0)], GRID_1.cells[(1,0)], GRID_1.cells[(0,1)], GRID_1.cells[(1,1)])
+    assert GRID_1.find_contradiction() is not None, "missed pool"
+
+
+def test_backtrack(GRID_3):
+    stats = backtrack(GRID_3, node_limit=1000)
+    assert stats.status == 'solved', "backtrack failed"
+    assert GRID_3.is_solved() and GRID_3.find_contradiction() is None, "backtrack solution invalid"
+
+
+def test_propagate_reaches_fixpoint(GRID_1, SOL_1_LIST):
+    GRID_1.propagate()
+    assert GRID_1.get_list_form() == SOL_1_LIST, "propagate failed"
+    assert GRID_1.propagator.run() == 0, "propagate didn't settle"
+
+
+def test_reach_index_matches_find_reach_white(GRID_3):
+    GRID_3.propagate()
+    propagator = GRID_3.propagator
+    for island in propagator.islands:
+        region = GRID_3.cell_list[island].region
+        assert propagator.reach_sets[island] == {cell.id for cell in GRID_3.find_reach_white(region)}, "stale reach index"
+
+
+def test_expansion_engine_matches_enumeration(GRID_2):
+    region = [r for r in GRID_2.white_regions if r.size_limit == 3][0]
+    GRID_2.set_color(2, GRID_2.cells[(3,3)])
+    expected = {cell.id for cell in set.intersection(*GRID_2.find_expansions_white(region)) if cell.color == 0}
+    assert ExpansionEngine().common_cells(GRID_2.state, region.id) == expected, "expansion engine disagrees"
+
+
+def test_expansion_engine_inconclusive():
+    b = Board([[0]*8 for _ in range(8)][:4] + [[0, 0, 0, 0, 12, 0, 0, 0]] + [[0]*8 for _ in range(3)])
+    engine = ExpansionEngine(node_limit=1)
+    assert engine.common_cells(b.state, b.cells[(4,4)].region.id) is None, "node limit ignored"
+
+
+def test_connect_black():
+    b = Board([[0]*3 for _ in range(3)])
+    b.set_color(2, b.cells[(0,0)], b.cells[(2,0)])
+    b.set_color(1, b.cells[(0,1)], b.cells[(2,1)], b.cells[(0,2)], b.cells[(1,2)], b.cells[(2,2)])
+    assert b.connect_black() == [(1,0)], "missed cut cell"
+    b = Board([[0]*3 for _ in range(3)])
+    b.set_color(2, b.cells[(0,0)], b.cells[(2,2)])
+    b.set_color(1, b.cells[(1,0)], b.cells[(0,1)])
+    with pytest.raises(Contradiction):
+        b.connect_black()
+
+
+def test_force_exits():
+    b = Board([[2, 0], [0, 0]])
+    b.set_color(2, b.cells[(0,1)])
+    assert b.force_exits() == [(1,0)], "missed island exit"
+    b = Board([[0, 0, 0], [0, 0, 0], [1, 0, 3]])
+    b.set_color(2, b.cells[(0,0)], b.cells[(2,0)])
+    b.set_color(1, b.cells[(1,0)])
+    assert b.force_exits() == [(1,1), (0,1), (2,1)], "missed white and black exits"
+
+
+@pytest.mark.parametrize('backend', ['bitboard', 'numpy'])
+def test_backend_matches_object_rules(GRID_3, backend):
+    if backend == 'numpy':
+        pytest.importorskip('numpy')
+    other = Board(jobj=GRID_3.simple(), backend=backend)
+    for board in (GRID_3, other):
+        board.set_color(2, board.cells[(0,0)], board.cells[(5,5)])
+        board.set_color(1, board.cells[(4,3)])
+    for region in GRID_3.white_regions:
+        if region.is_master():
+            other_region = other.cells[region.origin].region
+            assert {c.coords for c in other.find_reach_white(other_region)} == {c.coords for c in GRID_3.find_reach_white(region)}, "reach differs"
+    assert other.find_unreachable() == GRID_3.find_unreachable(), "find_unreachable differs"
+    assert other.prevent_pools() == GRID_3.prevent_pools(), "prevent_pools differs"
+    assert other.find_contradiction() == GRID_3.find_contradiction(), "find_contradiction differs"
+
+
+@pytest.mark.parametrize('backend', ['bitboard', 'numpy'])
+def test_backend_solves(GRID_3, backend):
+    if backend == 'numpy':
+        pytest.importorskip('numpy')
+    board = Board(jobj=GRID_3.simple(), backend=backend)
+    assert backtrack(board, node_limit=1000).status == 'solved', f"{backend} backtrack failed"
+    assert backtrack(GRID_3, node_limit=1000).status == 'solved'
+    assert board.get_list_form() == GRID_3.get_list_form(), "backends disagree"
+
+
+def test_parallel_propagator_matches_serial(GRID_3):
+    from parallel import ParallelPropagator
+    board = Board(jobj=GRID_3.simple(), workers=2)
+    board._propagator = ParallelPropagator(board, 2, min_islands=1)
+    GRID_3.propagate()
+    board.propagate()
+    assert board.get_list_form() == GRID_3.get_list_form(), "parallel propagation differs"
+    assert backtrack(board, node_limit=1000).status == 'solved' and board.copy().workers == 2
+
+
+def test_pickled_state_drops_shared_tables(GRID_3):
+    import pickle
+    from parallel import expansion_chunk
+    GRID_3.checkpoint()
+    payload = pickle.dumps(GRID_3.state, pickle.HIGHEST_PROTOCOL)
+    state = pickle.loads(payload)
+    assert state.nbors is state.geometry.nbors and state.trail is None and state.changes is None, "state not restored"
+    assert state.color == GRID_3.state.color and state.frontier == GRID_3.state.frontier, "state changed"
+    rid = state.find(next(i for i in range(state.size) if state.label[i] > 1))
+    assert expansion_chunk(payload, [rid], 0, 16) == [None], "worker ignored the board's node limit"
+
+
+def test_find_pathtree_white(GRID_1):
+    region = GRID_1.cells[(3,2)].region
+    pathtree = GRID_1.find_pathtree(region)
+    assert pathtree.union() == GRID_1.find_reach_white(region), "pathtree reach differs"
+    assert pathtree.expansions() == {frozenset(e) for e in GRID_1.find_expansions_white(region)}, "pathtree expansions differ"
+    assert pathtree.intersection() == set(region.members), "pathtree intersection failed"
+    leaf = next(iter(pathtree.get_leaves()))
+    assert leaf.get_path()[0] is pathtree and leaf.get_path()[-1] is leaf, "get_path failed"
+
+
+def test_find_pathtree_black_deep():
+    b = Board([[0]*100 for _ in range(100)])
+    walls = [b.cells[(x,y)] for y in range(1, 100, 2) for x in range(100) if x != (99 if y % 4 == 1 else 0)]
+    b.set_color(1, *walls)    # leaves a corridor winding back and forth over the even rows
+    end = b.cells[(0,98)]
+    pathtree = b.find_pathtree(b.cells[(0,0)], end_unit=end, color=2)
+    leaves = [leaf for leaf in pathtree.get_leaves() if end in leaf.unit]
+    assert len(leaves) == 1 and len(leaves[0].get_path()) == 50*100 + 49, "corridor path wrong"
+
+
+def test_import_is_light():
+    import subprocess, sys
+    heavy = ('tkinter', 'numpy', 'ordered_set', 'concurrent.futures.process')
+    loaded = subprocess.run([sys.executable, '-c', f"import board, sys; print([m for m in {heavy!r} if m in sys.modules])"],
+                            capture_output=True, text=True, check=True).stdout.strip()
+    assert loaded == '[]', f"importing board loads {loaded}"
+
 
+def test_reach_index_survives_rollback(monkeypatch):
+    # A search that rolls back a guess can leave an island with more reach than it had when last computed; every
+    # island find_unreachable trusts must still match its reach from scratch.
+    grid = [[0, 0, 0, 0, 0, 0, 0, 0], [0, 8, 0, 0, 0, 0, 0, 0], [0, 0, 0, 0, 0, 0, 0, 8], [0, 0, 0, 0, 1, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0, 1, 0], [0, 0, 0, 7, 0, 0, 0, 0], [0, 0, 0, 0, 0, 0, 2, 0], [0, 0, 0, 0, 0, 0, 0, 0],
+            [0, 0, 0, 0, 2, 0, 1, 0], [0, 0, 0, 0, 0, 0, 0, 0], [0, 0, 0, 7, 0, 0, 0, 4]]
+    stale = []
+    find_unreachable = Propagator.find_unreachable
 
+    def checked(self):
+        board, find = self.board, self.state.find
+        for island, reach_set in self.reach_sets.items():
+            if island not in self.dirty_reach and reach_set != board._reach_ids(find(island)):
+                stale.append(island)
+        find_unreachable(self)
 
+    monkeypatch.setattr(Propagator, 'find_unreachable', checked)
+    backtrack(Board(grid), node_limit=300, count=2)
+    assert not stale, f"stale reach for islands {sorted(set(stale))}"
@@ -0,0 +1,105 @@
+from collections import Counter, OrderedDict
+import hashlib
+import json
+import sqlite3
+
+
+def _rotate(grid):
+  # *grid* turned a quarter clockwise.
+  return [list(row) for row in zip(*grid[::-1])]
+
+
+def transform(grid, k):
+  # One of the 8 symmetries of a rectangle applied to *grid*: transposed if k >= 4, then rotated k % 4 quarter turns.
+  if k >= 4:
+    grid = [list(row) for row in zip(*grid)]
+  for _ in range(k % 4):
+    grid = _rotate(grid)
+  return grid
+
+
+def _inverse(k):
+  probe = [[0, 1, 2], [3, 4, 5]]
+  return next(j for j in range(8) if transform(transform(probe, k), j) == probe)
+
+INVERSE = [_inverse(k) for k in range(8)]   # transform(transform(grid, k), INVERSE[k]) == grid
+
+
+def canonical(grid):
+  # (key, k): a hash shared by every rotation and reflection of the clue grid *grid*, and the symmetry k that takes
+  # *grid* to the orientation the key was computed from.
+  k, form = min(((k, transform(grid, k)) for k in range(8)), key=lambda pair: (len(pair[1]), pair[1]))
+  return hashlib.sha1(json.dumps(form, separators=(',', ':')).encode()).hexdigest(), k
+
+
+class SolutionCache:
+  # Solutions of clue grids, shared by all rotations and reflections of a grid. The most recently used *capacity*
+  # solutions are kept in memory; with *path*, every solution is also stored in a sqlite database there, which survives
+  # the process and can be shared between processes. *stats* counts hits (in memory), disk_hits, misses, stores and
+  # evictions (from memory).
+
+  def __init__(self, capacity=1024, path=None):
+    self.capacity = capacity
+    self.path = path
+    self.memory = OrderedDict()   # key -> solution in the canonical orientation, least recently used first
+    self.stats = Counter()
+    self.db = None
+    if path is not None:
+      self.db = sqlite3.connect(path, timeout=30)
+      self.db.execute('CREATE TABLE IF NOT EXISTS solutions (key TEXT PRIMARY KEY, solution TEXT NOT NULL)')
+      self.db.commit()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.close()
+
+  def close(self):
+    if self.db is not None:
+      self.db.close()
+      self.db = None
+
+  def __len__(self):
+    return len(self.memory)
+
+  def _remember(self, key, solution):
+    self.memory[key] = solution
+    self.memory.move_to_end(key)
+    while len(self.memory) > self.capacity:
+      self.memory.popitem(last=False)
+      self.stats['evictions'] += 1
+
+  def get(self, grid):
+    # The solution of clue grid *grid* in its orientation, as a grid of colors like Board.get_list_form(), or None.
+    key, k = canonical(grid)
+    solution = self.memory.get(key)
+    if solution is not None:
+      self.memory.move_to_end(key)
+      self.stats['hits'] += 1
+    elif self.db is not None and (row := self.db.execute('SELECT solution FROM solutions WHERE key = ?', (key,)).fetchone()):
+      solution = json.loads(row[0])
+      self._remember(key, solution)
+      self.stats['disk_hits'] += 1
+    else:
+      self.stats['misses'] += 1
+      return None
+    return transform(solution, INVERSE[k])
+
+  def put(self, grid, solution):
+    key, k = canonical(grid)
+    solution = transform(solution, k)
+    self._remember(key, solution)
+    self.stats['stores'] += 1
+    if self.db is not None:
+      self.db.execute('INSERT OR REPLACE INTO solutions VALUES (?, ?)', (key, json.dumps(solution, separators=(',', ':'))))
+      self.db.commit()
+
+  def hit_rate(self):
+    lookups = self.stats['hits'] + self.stats['disk_hits'] + self.stats['misses']
+    return (self.stats['hits'] + self.stats['disk_hits']) / lookups if lookups else 0.0
+
+  def summary(self):
+    stats = self.stats
+    return (f"cache: {stats['hits']} hits, {stats['disk_hits']} disk hits, {stats['misses']} misses "
+            f"({self.hit_rate():.0%}), {stats['evictions']} evictions, {len(self)}/{self.capacity} in memory")
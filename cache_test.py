@@ -0,0 +1,37 @@
+from cache import *
+from board import Board
+
+
+def test_canonical_symmetries():
+    grid = [[1, 0, 0], [0, 0, 2]]
+    keys = {canonical(transform(grid, k))[0] for k in range(8)}
+    assert len(keys) == 1, "rotations and reflections got different keys"
+    assert canonical([[1, 0], [0, 0]])[0] != canonical([[2, 0], [0, 0]])[0], "different grids share a key"
+    for k in range(8):
+        assert transform(transform(grid, k), INVERSE[k]) == grid, f"INVERSE[{k}] is wrong"
+
+
+def test_solve_from_cache(GRID_1_LIST, tmp_path):
+    solution = Board(GRID_1_LIST).solve().get_list_form()
+    path = str(tmp_path / 'cache.sqlite')
+    with SolutionCache(capacity=1, path=path) as cache:
+        board = Board(GRID_1_LIST).solve(cache=cache)
+        assert cache.stats['misses'] == 1 and cache.stats['stores'] == 1
+        for k in range(8):
+            board = Board(transform(GRID_1_LIST, k)).solve(cache=cache)
+            assert board.get_list_form() == transform(solution, k), f"cached solution wrong under symmetry {k}"
+            assert board.state.trail is None, "cache hit left a checkpoint open"
+        assert cache.stats['hits'] == 8
+        cache.put([[1]], [[1]])
+        assert cache.stats['evictions'] == 1 and len(cache) == 1
+    with SolutionCache(path=path) as cache:
+        assert cache.get(transform(GRID_1_LIST, 5)) == transform(solution, 5) and cache.stats['disk_hits'] == 1
+
+
+def test_bad_cache_entry_is_a_miss(GRID_1_LIST):
+    cache = SolutionCache()
+    cache.put(GRID_1_LIST, [[1] * 5] * 5)
+    board = Board(GRID_1_LIST).solve(cache=cache)
+    assert board.is_solved() and board.find_contradiction() is None
+    assert board.state.trail is None, "rolled back cache entry left a checkpoint open"
+    assert cache.stats['stores'] == 2
@@ -0,0 +1,24 @@
+import pytest
+
+
+@pytest.fixture
+def GRID_1_LIST():
+    # The small puzzle most tests solve, as a clue grid; SOL_1_LIST is its solution.
+    return [
+                [0, 0, 0, 0, 0],
+                [0, 0, 0, 0, 0],
+                [3, 0, 0, 2, 0],
+                [0, 0, 0, 0, 1],
+                [3, 0, 0, 0, 0]
+            ]
+
+
+@pytest.fixture
+def SOL_1_LIST():
+    return [
+                [2, 2, 2, 2, 2],
+                [2, 1, 2, 1, 2],
+                [1, 1, 2, 1, 2],
+                [2, 2, 2, 2, 1],
+                [1, 1, 1, 2, 2]
+            ]
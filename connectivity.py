@@ -0,0 +1,74 @@
+from gridstate import Contradiction, unknown, white, black
+
+
+def black_cut_cells(state):
+  # Ids of the unknown cells that must be black because they're cut vertices of the non-white cells separating black
+  # cells from each other: painting one white would leave black disconnected.
+  # One iterative Tarjan pass over the non-white cells connected to the first black cell, counting the black cells
+  # below each cell of the DFS tree and how many of its child subtrees with black cells hang only on it.
+  # Raises Contradiction if some black cell isn't connected to the first through non-white cells.
+  color, nbors = state.color, state.nbors
+  blacks = color.count(black)
+  if blacks < 2:
+    return []
+  root = color.index(black)
+  disc = [-1] * state.size      # DFS discovery order
+  low = [0] * state.size        # lowest discovery order reachable from the subtree through one back edge
+  parent = [-1] * state.size
+  below = [0] * state.size      # black cells in the subtree
+  cut_off = [0] * state.size    # black cells in the child subtrees that only connect to the rest through this cell
+  groups = [0] * state.size     # number of those child subtrees
+  disc[root], below[root] = 0, 1
+  order = 1
+  stack = [(root, iter(nbors[root]))]
+  while stack:
+    v, pending = stack[-1]
+    for w in pending:
+      if color[w] == white:
+        continue
+      if disc[w] < 0:
+        parent[w], disc[w], low[w], below[w] = v, order, order, color[w] == black
+        order += 1
+        stack.append((w, iter(nbors[w])))
+        break
+      if w != parent[v] and disc[w] < low[v]:
+        low[v] = disc[w]
+    else:
+      stack.pop()
+      p = parent[v]
+      if p >= 0:
+        below[p] += below[v]
+        if low[v] < low[p]:
+          low[p] = low[v]
+        if low[v] >= disc[p] and below[v]:
+          cut_off[p] += below[v]
+          groups[p] += 1
+  if below[root] != blacks:
+    raise Contradiction("black is disconnected")
+  return [i for i in range(state.size)
+          if color[i] == unknown and disc[i] >= 0 and groups[i] + (blacks > cut_off[i]) >= 2]
+
+
+def single_exits(state):
+  # (ids that must be white, ids that must be black): the only unknown neighbor of each island that isn't full yet or
+  # white region without a clue, and of each black region that isn't all of the black cells.
+  color, nbors, find = state.color, state.nbors, state.find
+  exits = {}    # region id -> ids of its unknown neighbors
+  for i in range(state.size):
+    if color[i] == unknown:
+      for n in nbors[i]:
+        if color[n] != unknown:
+          exits.setdefault(find(n), set()).add(i)
+  blacks = color.count(black)
+  to_white, to_black = set(), set()
+  for rid in state.live_regions():
+    region_exits = exits.get(rid, ())
+    if len(region_exits) != 1:
+      continue
+    if color[rid] == white and (state.origin[rid] < 0 or state.count[rid] < state.size_limit[rid]):
+      to_white.update(region_exits)
+    elif color[rid] == black and state.count[rid] < blacks:
+      to_black.update(region_exits)
+  if not to_white.isdisjoint(to_black):
+    raise Contradiction(f"cell at {state.coords(min(to_white & to_black))} is the only exit of a black and a white region")
+  return sorted(to_white), sorted(to_black)
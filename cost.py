@@ -0,0 +1,148 @@
+import argparse
+import json
+import math
+
+from board import Board
+from gridstate import Contradiction, unknown
+
+FEATURES = ('clue_density', 'largest_island', 'free_ratio', 'coverage', 'log_cells')
+
+# log(seconds to solve) = intercept + sum of coefficient * feature, as fit to the results of solving benchmark_corpus.json
+# serially (see fit). Seconds depend on the machine; refit from a batch run's records to adjust.
+DEFAULT_MODEL = {
+                  'intercept': -8.887,
+                  'coefficients': {
+                                    'clue_density': 0.1195,
+                                    'largest_island': 0.1411,
+                                    'free_ratio': -0.7315,
+                                    'coverage': -3.160,
+                                    'log_cells': 1.297,
+                                },
+                  'classes': [['easy', 0.01], ['medium', 0.1], ['hard', None]],   # (class, predicted seconds it's below)
+              }
+
+
+def features(grid):
+  # Cheap numbers describing a clue grid, for predicting how long it takes to solve:
+  #   clue_density    clues per cell
+  #   largest_island  the biggest clue
+  #   free_ratio      share of the cells left over once every island has its size, i.e. that end up black
+  #   coverage        share of the unknown cells one find_unreachable pass paints black on the fresh board
+  #   log_cells       log of the number of cells
+  height, width = len(grid), len(grid[0])
+  cells = width*height
+  clues = [clue for row in grid for clue in row if clue]
+  board = Board(grid)
+  unknowns = board.state.color.count(unknown)
+  try:
+    painted = len(board.find_unreachable())
+  except Contradiction:    # it'll be found unsolvable right away
+    painted = unknowns
+  return {
+            'clue_density': len(clues) / cells,
+            'largest_island': max(clues, default=0),
+            'free_ratio': max(0, cells - sum(clues)) / cells,
+            'coverage': painted / unknowns if unknowns else 1.0,
+            'log_cells': math.log(cells),
+        }
+
+
+def predict(feature_values, model=DEFAULT_MODEL):
+  # Predicted seconds to solve a puzzle with *feature_values*.
+  coefficients = model['coefficients']
+  return math.exp(model['intercept'] + sum(coefficients[name] * feature_values[name] for name in FEATURES))
+
+
+def cost_class(seconds, model=DEFAULT_MODEL):
+  # The name of the first class of *model* whose bound is above *seconds*.
+  for name, bound in model['classes']:
+    if bound is None or seconds < bound:
+      return name
+
+
+def estimate(grid, model=DEFAULT_MODEL):
+  # {'features', 'predicted_cost', 'predicted_class'} for *grid*, to be stored in its batch record.
+  values = features(grid)
+  seconds = predict(values, model)
+  return {'features': values, 'predicted_cost': seconds, 'predicted_class': cost_class(seconds, model)}
+
+
+def _solve_linear(a, b):
+  # x with a x = b, by Gaussian elimination with partial pivoting; a is square and nonsingular (see fit's ridge term).
+  n = len(b)
+  rows = [list(a[i]) + [b[i]] for i in range(n)]
+  for col in range(n):
+    pivot = max(range(col, n), key=lambda r: abs(rows[r][col]))
+    rows[col], rows[pivot] = rows[pivot], rows[col]
+    for r in range(n):
+      if r != col and rows[r][col]:
+        factor = rows[r][col] / rows[col][col]
+        rows[r] = [x - factor*y for x, y in zip(rows[r], rows[col])]
+  return [rows[i][n] / rows[i][i] for i in range(n)]
+
+
+def fit(records, classes=None, ridge=1e-3):
+  # A model fit by least squares to batch *records* carrying 'features' and 'wall_time' (see batch.solve_batch with
+  # schedule), predicting log(wall_time). A small *ridge* keeps it defined when a feature doesn't vary.
+  rows, targets = [], []
+  for record in records:
+    if record.get('features') and record.get('wall_time'):
+      rows.append([1.0] + [record['features'][name] for name in FEATURES])
+      targets.append(math.log(max(record['wall_time'], 1e-6)))
+  if len(rows) <= len(FEATURES):
+    raise ValueError(f"need more than {len(FEATURES)} records with features to fit, got {len(rows)}")
+  n = len(FEATURES) + 1
+  gram = [[sum(row[i]*row[j] for row in rows) + (ridge*len(rows) if i == j and i else 0.0) for j in range(n)] for i in range(n)]
+  moments = [sum(row[i]*t for row, t in zip(rows, targets)) for i in range(n)]
+  weights = _solve_linear(gram, moments)
+  return {
+            'intercept': weights[0],
+            'coefficients': dict(zip(FEATURES, weights[1:])),
+            'classes': classes or DEFAULT_MODEL['classes'],
+        }
+
+
+def load_model(path=None):
+  if path is None:
+    return DEFAULT_MODEL
+  with open(path, 'r') as read_file:
+    return json.load(read_file)
+
+
+def report(records, model=DEFAULT_MODEL):
+  # {predicted class: {actual class: count}} over *records* that carry a prediction.
+  table = {name: {other: 0 for other, _ in model['classes']} for name, _ in model['classes']}
+  for record in records:
+    if 'predicted_class' in record:
+      table[record['predicted_class']][cost_class(record['wall_time'], model)] += 1
+  return table
+
+
+def main(argv=None):
+  from stream import JSONStream
+  parser = argparse.ArgumentParser(description="Fit or check the batch solver's cost model on batch results.")
+  parser.add_argument('command', choices=('fit', 'report'))
+  parser.add_argument('results', nargs='+', help="batch result files (JSONL) written with --schedule")
+  parser.add_argument('-m', '--model', help="model to report on (default: the built-in one)")
+  parser.add_argument('-o', '--output', default='-', help="where fit writes the model (default: stdout)")
+  args = parser.parse_args(argv)
+
+  records = []
+  for path in args.results:
+    with open(path, 'r') as read_file:
+      records.extend(JSONStream(read_file))
+  model = load_model(args.model)
+  if args.command == 'fit':
+    text = json.dumps(fit(records, model['classes']), indent=2)
+    if args.output == '-':
+      print(text)
+    else:
+      with open(args.output, 'w') as write_file:
+        write_file.write(text + '\n')
+  else:
+    for predicted, row in report(records, model).items():
+      print(f"predicted {predicted:>8}: " + ', '.join(f"{count} {actual}" for actual, count in row.items()))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,26 @@
+import math
+import random
+
+from cost import *
+
+
+def test_features():
+    values = features([[2, 0, 0], [0, 0, 0], [0, 0, 1]])
+    assert values['clue_density'] == 2/9 and values['largest_island'] == 2 and values['free_ratio'] == 6/9, "features wrong"
+    assert values['coverage'] == 5/7, "find_unreachable coverage wrong"   # all but the two cells next to the 2
+    assert 0 < estimate([[1]])['predicted_cost'] and cost_class(1e9) == 'hard', "estimate failed"
+
+
+def test_fit_recovers_model():
+    rng = random.Random(0)
+    weights = dict(zip(FEATURES, (1.0, 0.2, -2.0, -3.0, 1.5)))
+    records = []
+    for _ in range(50):
+        values = {name: rng.random() for name in FEATURES}
+        records.append({'features': values, 'wall_time': math.exp(-5 + sum(weights[n]*values[n] for n in FEATURES))})
+    model = fit(records, ridge=0)
+    assert abs(model['intercept'] + 5) < 1e-6, "intercept wrong"
+    assert all(abs(model['coefficients'][n] - weights[n]) < 1e-6 for n in FEATURES), "coefficients wrong"
+    for record in records:
+        record['predicted_class'] = cost_class(predict(record['features'], model), model)
+    assert sum(row[name] for name, row in report(records, model).items()) == 50, "report didn't match classes up"
@@ -0,0 +1,143 @@
+from collections import OrderedDict
+
+from gridstate import unknown, white, black
+
+
+class Inconclusive(Exception):
+  # The node limit ran out before the engine could decide.
+  pass
+
+
+class ExpansionEngine:
+  # Finds the cells every complete expansion of an island needs, without enumerating all the expansions.
+  # It finds one expansion, then for each unknown cell in it either finds an expansion that avoids the cell
+  # (dropping every cell that expansion lacks) or shows none exists. A cell is forced outright, without searching,
+  # if the cells the island could still reach without it are too few to complete the island.
+  # Results are cached on the state of the island's neighborhood, and a search that visits more than *node_limit*
+  # partial shapes is inconclusive.
+
+  def __init__(self, node_limit=20000, cache_size=4096):
+    self.node_limit = node_limit
+    self.cache_size = cache_size
+    self.cache = OrderedDict()
+    self.stats = {'hits': 0, 'misses': 0, 'inconclusive': 0, 'nodes': 0}
+
+  def common_cells(self, state, rid):
+    # Return the ids of the unknown cells in every expansion of island *rid*, or None if that's inconclusive.
+    # No expansion at all also gives an empty set; Board.find_contradiction reports those islands.
+    key = self._key(state, rid)
+    try:
+      result = self.cache[key]
+    except KeyError:
+      pass
+    else:
+      self.stats['hits'] += 1
+      self.cache.move_to_end(key)
+      return result
+
+    self.stats['misses'] += 1
+    self._nodes = 0
+    try:
+      result = self._common_cells(state, rid)
+    except Inconclusive:
+      self.stats['inconclusive'] += 1
+      result = None
+    self.stats['nodes'] += self._nodes
+    self.cache[key] = result
+    if len(self.cache) > self.cache_size:
+      self.cache.popitem(last=False)
+    return result
+
+  def _key(self, state, rid):
+    # Everything an expansion of *rid* can depend on: its members and size, and the cells within one step of its range.
+    color, origin, members = state.color, state.origin, state.members
+    island = frozenset(members(rid))
+    ball = state.geometry.ball(state.size_limit[rid] - state.count[rid] + 1)
+    area = set().union(*(ball[i] for i in island)) - island
+    local = []
+    for i in sorted(area):
+      if color[i] == unknown:
+        others = tuple(sorted(
+                              (r, True) if origin[r] >= 0 else (r, frozenset(members(r)))
+                              for r in state.potential_of(i) if r != rid
+                            ))
+        local.append((i, unknown, others))
+      else:
+        local.append((i, color[i]))
+    return (state.width, state.height, state.size_limit[rid], island, tuple(local))
+
+  def _allowed(self, state, rid, i):
+    # Whether cell *i* could ever join island *rid*.
+    color, origin = state.color, state.origin
+    if color[i] == black:
+      return False
+    if color[i] == white:
+      r = state.find(i)
+      return r == rid or origin[r] < 0
+    return not state.borders_other_island(i, rid)
+
+  def _too_far(self, state, rid, banned):
+    # Whether island *rid* can't complete without *banned*: fewer than its size_limit cells are within the remaining
+    # distance of it along cells it could join, once *banned* is taken out.
+    members = state.members(rid)
+    allowance = state.size_limit[rid] - len(members)
+    nbors = state.nbors
+    seen = set(members)
+    layer = list(members)
+    for _ in range(allowance):
+      next_layer = []
+      for i in layer:
+        for n in nbors[i]:
+          if n != banned and n not in seen and self._allowed(state, rid, n):
+            seen.add(n)
+            next_layer.append(n)
+      layer = next_layer
+    return len(seen) < state.size_limit[rid]
+
+  def _find_expansion(self, state, rid, banned=None):
+    # Depth-first search for one complete expansion of *rid* that doesn't use cell *banned*.
+    color, members, potential_of, nbors = state.color, state.members, state.potential_of, state.nbors
+    borders_other_island, annexed_size = state.borders_other_island, state.annexed_size
+    size_limit = state.size_limit[rid]
+    own = frozenset((rid,))
+    start = frozenset(members(rid))
+    if len(start) == size_limit:
+      return start
+    seen = {start}
+    stack = [start]
+    while stack:
+      current = stack.pop()
+      self._nodes += 1
+      if self._nodes > self.node_limit:
+        raise Inconclusive()
+      for nbor in {n for i in current for n in nbors[i]}.difference(current):
+        if nbor == banned or color[nbor] != unknown or borders_other_island(nbor, rid):
+          continue
+        size = len(current) + annexed_size(nbor, rid, current)
+        if size > size_limit:
+          continue
+        potential = potential_of(nbor)
+        expansion = current | {nbor} if potential <= own else current.union((nbor,), *(members(r) for r in potential-own))
+        if size == size_limit:
+          return expansion
+        if expansion not in seen:
+          seen.add(expansion)
+          stack.append(expansion)
+    return None
+
+  def _common_cells(self, state, rid):
+    expansion = self._find_expansion(state, rid)
+    if expansion is None:
+      return frozenset()
+    color = state.color
+    candidates = {i for i in expansion if color[i] == unknown}
+    for cell in sorted(candidates):
+      if cell not in candidates or self._too_far(state, rid, cell):
+        continue
+      avoiding = self._find_expansion(state, rid, banned=cell)
+      if avoiding is not None:
+        candidates &= avoiding
+    return frozenset(candidates)
+
+
+ENGINE = ExpansionEngine()
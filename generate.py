@@ -0,0 +1,242 @@
+from collections import deque
+from time import perf_counter
+import argparse
+import random
+import sys
+
+from backtrack import backtrack
+from board import Board
+from geometry import geometry
+from gridstate import white, black
+from stream import RecordWriter
+
+DIFFICULTIES = ('normal', 'hard', 'any')   # normal: the inference rules solve it alone; hard: it takes a search
+
+
+def _black_connected(color, nbors, blacks):
+  # Whether the *blacks* black cells of *color* are all connected.
+  start = color.index(black) if blacks else None
+  if start is None:
+    return True
+  seen = {start}
+  queue = deque([start])
+  while queue:
+    for n in nbors[queue.popleft()]:
+      if n not in seen and color[n] == black:
+        seen.add(n)
+        queue.append(n)
+  return len(seen) == blacks
+
+
+def random_solution(width, height, rng, max_island=None):
+  # A random solved board as (colors by cell id, islands as lists of cell ids), or None if this attempt got stuck.
+  # Starts all black and carves out islands one at a time, each from a seed that doesn't touch another island, growing it
+  # cell by cell to a random size while black stays connected. 2x2 black squares left over are then broken up one at a
+  # time; it fails only if a square has no cell that can turn white without splitting black or joining two islands.
+  geo = geometry(width, height)
+  nbors, size = geo.nbors, width*height
+  max_island = max_island or max(2, min(5, size // 8))
+  color = [black] * size
+  owner = [-1] * size     # island index of each white cell
+  islands = []
+  blacks = size
+
+  def keeps_black_connected(i):
+    color[i] = white
+    ok = _black_connected(color, nbors, blacks-1)
+    color[i] = black
+    return ok
+
+  def free(i, island):
+    # Whether black cell *i* could turn white as part of *island* without touching another island or splitting black.
+    if color[i] != black or any(owner[n] not in (-1, island) for n in nbors[i]):
+      return False
+    return keeps_black_connected(i)
+
+  def carve(i, island):
+    nonlocal blacks
+    color[i] = white
+    owner[i] = island
+    blacks -= 1
+    islands[island].append(i)
+
+  def pools():
+    return [square for square in geo.squares if all(color[i] == black for i in square)]
+
+  seeds = list(range(size))
+  rng.shuffle(seeds)
+  for seed in seeds:
+    if not free(seed, len(islands)):
+      continue
+    islands.append([])
+    carve(seed, len(islands)-1)
+    target = min(rng.randint(1, max_island), rng.randint(1, max_island))    # mostly small, as in published puzzles
+    while len(islands[-1]) < target:
+      frontier = sorted({n for i in islands[-1] for n in nbors[i] if free(n, len(islands)-1)})
+      if not frontier:
+        break
+      carve(rng.choice(frontier), len(islands)-1)
+
+  for square in pools():
+    if all(color[i] == black for i in square):
+      # Whiten one of its cells: preferably by growing an island next to it that has room, else by starting a new
+      # one-cell island there, else by letting a neighbor outgrow max_island, else by joining the islands around it.
+      options = [(i, island) for i in square for island in {owner[n] for n in nbors[i] if owner[n] >= 0}
+                 if len(islands[island]) < max_island and free(i, island)]
+      if not options:
+        options = [(i, len(islands)) for i in square if free(i, len(islands))]
+        if options:
+          islands.append([])
+      if not options:
+        options = [(i, island) for i in square for island in {owner[n] for n in nbors[i] if owner[n] >= 0} if free(i, island)]
+      if not options:
+        joints = [i for i in square if keeps_black_connected(i)]
+        if not joints:
+          return None
+        i = rng.choice(joints)
+        merged = sorted({owner[n] for n in nbors[i] if owner[n] >= 0})
+        for island in merged[1:]:
+          for j in islands[island]:
+            owner[j] = merged[0]
+          islands[merged[0]].extend(islands[island])
+          islands[island] = []
+        options = [(i, merged[0])]
+      carve(*rng.choice(sorted(options)))
+  if pools():
+    return None
+  return color, [island for island in islands if island]
+
+
+def place_clues(width, height, islands, rng):
+  # A clue grid with each island's size on one of its cells, chosen at random.
+  grid = [[0] * width for _ in range(height)]
+  for island in islands:
+    i = rng.choice(island)
+    grid[i // width][i % width] = len(island)
+  return grid
+
+
+def rate(grid, node_limit=2000, found=None):
+  # (number of solutions, up to 2, or None if the search ran out; search nodes it took to find the first).
+  # The solutions the search finds are appended to *found* (see backtrack).
+  board = Board(grid)
+  board.propagator.run()
+  if board.is_solved() and board.find_contradiction() is None:
+    return 1, 0
+  stats = backtrack(board, node_limit=node_limit, count=2, found=found)
+  if stats.status == 'budget':
+    return None, stats.nodes
+  return stats.solutions, stats.nodes
+
+
+def make_unique(grid, colors, islands, rng, node_limit=2000, max_rounds=None):
+  # Adjust *grid*, placed on the solution (*colors*, *islands*) by place_clues, until that's its only solution or
+  # *max_rounds* searches (by default half the islands) have found another. Each time one does, every island
+  # the other solution changes is fixed to rule it out: grown onto a black cell the other solution gives it, if that
+  # keeps black connected and it borders no other island, else with its clue moved onto one of its cells the other
+  # solution leaves black. Changes all three in place and returns rate's result for the final grid.
+  width = len(grid[0])
+  nbors = geometry(width, len(grid)).nbors
+  owner = {i: k for k, island in enumerate(islands) for i in island}
+  clue_at = [next(i for i in island if grid[i // width][i % width]) for island in islands]
+  for _ in range(len(islands) // 2 if max_rounds is None else max_rounds):
+    found = []
+    solutions, nodes = rate(grid, node_limit, found)
+    if solutions != 2:
+      return solutions, nodes
+    other = next(flat for solution in found if (flat := [c for row in solution for c in row]) != colors)
+
+    def grows(i, k):
+      # Whether island *k* can take black cell *i* without touching another island or splitting black.
+      if {owner[n] for n in nbors[i] if colors[n] == white} != {k}:
+        return False
+      colors[i] = white
+      ok = _black_connected(colors, nbors, colors.count(black))
+      colors[i] = black
+      return ok
+
+    gained = [i for i, c in enumerate(colors) if c == black and other[i] == white]
+    for k, island in enumerate(islands):
+      growth = [i for i in gained if colors[i] == black and grows(i, k)]
+      if growth:
+        i = rng.choice(growth)
+        colors[i] = white
+        owner[i] = k
+        island.append(i)
+      else:
+        cells = [i for i in island if other[i] != white]
+        if not cells:
+          continue
+        grid[clue_at[k] // width][clue_at[k] % width] = 0
+        clue_at[k] = rng.choice(cells)
+      grid[clue_at[k] // width][clue_at[k] % width] = len(island)
+  return rate(grid, node_limit)
+
+
+def generate_one(width, height, difficulty='any', seed=None, max_tries=200, node_limit=2000):
+  # A uniquely solvable puzzle of *difficulty* as a record with 'id', 'grid', 'solution', 'nodes' and 'tries', or None
+  # if *max_tries* random solutions all failed.
+  rng = random.Random(seed)
+  for tries in range(1, max_tries+1):
+    solution = random_solution(width, height, rng)
+    if solution is None:
+      continue
+    colors, islands = solution
+    grid = place_clues(width, height, islands, rng)
+    solutions, nodes = make_unique(grid, colors, islands, rng, node_limit)
+    if solutions != 1 or (difficulty == 'normal' and nodes) or (difficulty == 'hard' and not nodes):
+      continue
+    return {
+              'id': f'gen-{width}x{height}-{difficulty}-{seed}',
+              'grid': grid,
+              'solution': [colors[y*width:(y+1)*width] for y in range(height)],
+              'nodes': nodes,
+              'tries': tries,
+          }
+  return None
+
+
+def generate(count, width, height, difficulty='any', workers=None, seed=0, max_tries=200, node_limit=2000, max_seeds=None):
+  # Yield *count* generated puzzles (see generate_one), made in parallel over *workers* processes. Puzzle k comes from
+  # seed *seed*+k, so runs with the same arguments give the same puzzles in the same order. Seeds that give no puzzle are
+  # replaced by the next ones, up to *max_seeds* seeds in all (by default twice *count*), so it can yield fewer.
+  max_seeds = 2*count if max_seeds is None else max_seeds
+  from concurrent.futures import ProcessPoolExecutor   # not at the top, so importing this module stays light
+  with ProcessPoolExecutor(workers) as pool:
+    made = 0
+    next_seed = seed
+    while made < count and next_seed < seed + max_seeds:
+      seeds = range(next_seed, min(next_seed + (count - made), seed + max_seeds))
+      next_seed += len(seeds)
+      for record in pool.map(generate_one, *zip(*[(width, height, difficulty, s, max_tries, node_limit) for s in seeds])):
+        if record is not None:
+          made += 1
+          yield record
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Generate uniquely solvable Nurikabe puzzles offline.")
+  parser.add_argument('-n', '--count', type=int, default=10)
+  parser.add_argument('-s', '--size', default='10x10', help="WIDTHxHEIGHT, or one number for a square")
+  parser.add_argument('-d', '--difficulty', choices=DIFFICULTIES, default='any')
+  parser.add_argument('-w', '--workers', type=int, default=None)
+  parser.add_argument('-o', '--output', default='-', help="write puzzles here as JSONL (default: stdout)")
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--node-limit', type=int, default=2000, help="search nodes allowed for the uniqueness check")
+  parser.add_argument('--max-seeds', type=int, default=None, help="seeds to try before giving up (default: 2 x count)")
+  args = parser.parse_args(argv)
+  width, _, height = args.size.partition('x')
+  width, height = int(width), int(height or width)
+
+  start = perf_counter()
+  made = 0
+  with RecordWriter(args.output) as writer:
+    for record in generate(args.count, width, height, args.difficulty, args.workers, args.seed, node_limit=args.node_limit,
+                           max_seeds=args.max_seeds):
+      writer.write(record)
+      made += 1
+  print(f"Generated {made} of {args.count} puzzles in {perf_counter()-start:.1f}s.", file=sys.stderr)
+
+
+if __name__ == '__main__':
+  main()
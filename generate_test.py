@@ -0,0 +1,45 @@
+import random
+
+import pytest
+
+from generate import *
+from backtrack import backtrack
+from board import Board
+from gridstate import unknown
+
+
+def test_count_solutions():
+    ambiguous = Board([[2, 0], [0, 0]])    # the second white cell can go right or down
+    stats = backtrack(ambiguous, node_limit=100, count=2)
+    assert stats.status == 'solved' and stats.solutions == 2, "didn't find both solutions"
+    assert ambiguous.is_solved() and ambiguous.find_contradiction() is None, "board not left with a solution"
+    unique = Board([[1, 0], [0, 0], [0, 2]])
+    stats = backtrack(unique, node_limit=100, count=2)
+    assert stats.status == 'solved' and stats.solutions == 1, "unique puzzle got more solutions"
+
+
+def test_propagation_agrees_with_generated_solutions():
+    rng = random.Random(1)
+    for _ in range(200):
+        solution = random_solution(7, 7, rng)
+        if solution is None:
+            continue
+        colors, islands = solution
+        board = Board(place_clues(7, 7, islands, rng)).propagate()
+        wrong = [i for i, c in enumerate(board.state.color) if c != unknown and c != colors[i]]
+        assert not wrong, f"rules painted cells against a valid solution: {board.get_clue_form()}"
+
+
+@pytest.mark.parametrize('size, difficulty, seed', [(6, 'any', 2), (10, 'hard', 2), (15, 'any', 1)])
+def test_generate_one(size, difficulty, seed):
+    record = generate_one(size, size, difficulty, seed=seed)
+    assert record is not None, "no puzzle generated"
+    board = Board(record['grid'])
+    assert backtrack(board, node_limit=2000, count=2).solutions == 1, "generated puzzle isn't unique"
+    assert board.get_list_form() == record['solution'], "recorded solution is wrong"
+    assert difficulty == 'any' or (record['nodes'] > 0) == (difficulty == 'hard'), "wrong difficulty"
+    assert generate_one(size, size, difficulty, seed=seed) == record, "same seed gave a different puzzle"
+
+
+def test_generate_gives_up():
+    assert len(list(generate(3, 6, 6, workers=1, max_tries=1, max_seeds=2))) <= 2, "generate tried past max_seeds"
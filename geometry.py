@@ -0,0 +1,76 @@
+from functools import lru_cache
+
+
+class Geometry:
+  # Immutable index tables for one board shape. Cells are ids (y*width + x).
+  # Get instances through geometry() so boards of the same shape share them.
+
+  def __init__(self, width, height):
+    self.width = width
+    self.height = height
+    self.size = width*height
+    self.nbors = self._build_nbors()
+    self.squares = self._build_squares()              # every in-bounds 2x2 square as (top-left, top-right, bottom-left, bottom-right)
+    self.cell_squares = self._build_cell_squares()    # by cell id: the in-bounds squares that include the cell
+    self._balls = {1: self.nbors}
+
+  def __deepcopy__(self, memo):
+    return self
+
+  def __reduce__(self):
+    return (geometry, (self.width, self.height))
+
+  def _build_nbors(self):
+    # Orthogonal neighbor ids of each cell.
+    w, h = self.width, self.height
+    table = []
+    for i in range(self.size):
+      x, y = i % w, i // w
+      nbors = []
+      if x > 0:
+        nbors.append(i-1)
+      if x < w-1:
+        nbors.append(i+1)
+      if y > 0:
+        nbors.append(i-w)
+      if y < h-1:
+        nbors.append(i+w)
+      table.append(tuple(nbors))
+    return tuple(table)
+
+  def _build_squares(self):
+    w = self.width
+    return tuple((i, i+1, i+w, i+w+1) for i in range(self.size) if i % w < w-1 and i // w < self.height-1)
+
+  def _build_cell_squares(self):
+    table = [[] for _ in range(self.size)]
+    for square in self.squares:
+      for i in square:
+        table[i].append(square)
+    return tuple(tuple(squares) for squares in table)
+
+  def ball(self, d):
+    # By cell id: ids of the cells at most taxicab distance *d* away, excluding the cell itself.
+    if d < 1:
+      return ((),)*self.size
+    try:
+      return self._balls[d]
+    except KeyError:
+      pass
+    w, h = self.width, self.height
+    table = []
+    for i in range(self.size):
+      x, y = i % w, i // w
+      table.append(tuple(
+                          ny*w + nx
+                          for ny in range(max(0, y-d), min(h, y+d+1))
+                          for nx in range(max(0, x-(d-abs(ny-y))), min(w, x+(d-abs(ny-y))+1))
+                          if (nx, ny) != (x, y)
+                        ))
+    table = self._balls[d] = tuple(table)
+    return table
+
+
+@lru_cache(maxsize=None)
+def geometry(width, height):
+  return Geometry(width, height)
@@ -0,0 +1,256 @@
+from array import array
+
+from geometry import geometry
+
+unknown = 0
+white = 1
+black = 2
+
+NO_REGION = -1
+MANY = -2       # masters code for cells that border more than one island
+NO_LIMIT = 0    # size_limit code for regions that can grow without bound (black regions, remote white parts)
+NO_LABEL = 0
+BULLET = -1     # label code for white cells deduced by the solver
+EMPTY = frozenset()
+
+
+class Contradiction(Exception):
+  # The board state can't lead to a valid solution.
+  pass
+
+
+class GridState:
+  # Flat storage for a board, indexed by cell id (y*width + x).
+  # Regions are a disjoint-set forest over the colored cells: a region's id is the id of its root cell,
+  # so region-level buffers are indexed the same way and any member id resolves to the region through find().
+  # Potential sets are frozensets that are replaced, never mutated, so snapshots can share them.
+  # Adjacency between white regions and unknown cells is kept both ways, updated as cells are painted and regions merge:
+  # potential maps a cell to the regions it borders, frontier a white region to the cells it borders, and masters says
+  # which island, if any, a cell borders, so borders_other_island and annexed_size answer without building sets.
+
+  def __init__(self, width, height):
+    self.width = width
+    self.height = height
+    self.size = n = width*height
+
+    self.color = array('b', bytes(n))
+    self.label = array('i', [NO_LABEL])*n         # clue number, BULLET, or NO_LABEL
+
+    self.parent = array('i', [NO_REGION])*n      # disjoint-set parent, NO_REGION for unknown cells
+    self.link = array('i', range(n))             # next member in the region's circular member list
+    self.count = array('i', bytes(4*n))          # by region id: number of members
+
+    self.size_limit = array('i', [NO_LIMIT])*n   # by region id
+    self.origin = array('i', [-1])*n             # by region id: cell id of the clue, -1 if not a master
+    self.potential = [EMPTY]*n                   # by cell id: ids of white regions an unknown cell borders (may be stale, see potential_of)
+    self.frontier = [EMPTY]*n                    # by region id: ids of the cells a white region borders (may be colored since, see frontier_of)
+    self.masters = array('i', [NO_REGION])*n     # by cell id: origin of the one island an unknown cell borders, MANY, or NO_REGION
+
+    self.geometry = geometry(width, height)
+    self.nbors = self.geometry.nbors
+    self.trail = None                            # (buffer, index, old value) of every write since the first open checkpoint
+    self.changes = None                          # ids of cells whose color changed, for a Propagator to drain; None if nobody listens
+    self.rolled_back = False                     # whether a rollback recolored cells since the Propagator last drained changes
+
+  def __getstate__(self):
+    # Pickles leave out the neighbor table, which geometry() rebuilds, and what only this state's checkpoints and
+    # Propagator use, so the snapshots ParallelPropagator sends its workers stay small.
+    state = dict(self.__dict__)
+    for name in ('nbors', 'trail', 'changes'):
+      del state[name]
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self.nbors = self.geometry.nbors
+    self.trail = None
+    self.changes = None
+
+  def snapshot(self):
+    # Independent copy of this state. Buffers are copied wholesale; potential and frontier sets are shared since they're
+    # never mutated.
+    state = object.__new__(GridState)
+    state.__dict__.update(self.__dict__)
+    for name in ('color', 'label', 'parent', 'link', 'count', 'size_limit', 'origin', 'masters'):
+      setattr(state, name, array(getattr(self, name).typecode, getattr(self, name)))
+    state.potential = list(self.potential)
+    state.frontier = list(self.frontier)
+    state.trail = None
+    state.changes = None
+    state.rolled_back = False
+    return state
+
+  def checkpoint(self):
+    # Start recording writes if needed and return a token for rollback().
+    if self.trail is None:
+      self.trail = []
+    return len(self.trail)
+
+  def rollback(self, token):
+    # Undo every write made since checkpoint() returned *token*.
+    trail = self.trail
+    assert trail is not None and token <= len(trail), "Unknown checkpoint."
+    changes = self.changes
+    while len(trail) > token:
+      buf, i, old = trail.pop()
+      buf[i] = old
+      if changes is not None and buf is self.color:
+        changes.append(i)
+        self.rolled_back = True
+
+  def commit(self):
+    # Forget all checkpoints and stop recording writes.
+    self.trail = None
+
+  def _write(self, buf, i, value):
+    if self.trail is not None:
+      self.trail.append((buf, i, buf[i]))
+    buf[i] = value
+
+  def cell_id(self, x, y):
+    return y*self.width + x
+
+  def coords(self, i):
+    return (i % self.width, i // self.width)
+
+  def find(self, i):
+    # Region id of cell *i*, or NO_REGION if it's unknown.
+    parent = self.parent
+    root = i
+    while parent[root] != root:
+      if parent[root] == NO_REGION:
+        return NO_REGION
+      root = parent[root]
+    if self.trail is None:    # path compression isn't recorded, so skip it while checkpoints are open
+      while parent[i] != root:
+        parent[i], i = root, parent[i]
+    return root
+
+  def members(self, rid):
+    # Member ids of region *rid*.
+    link = self.link
+    members = [rid]
+    i = link[rid]
+    while i != rid:
+      members.append(i)
+      i = link[i]
+    return members
+
+  def potential_of(self, i):
+    # Ids of the live white regions unknown cell *i* borders.
+    potential = self.potential[i]
+    if potential:
+      find = self.find
+      resolved = frozenset(find(r) for r in potential)
+      if resolved != potential:
+        self._write(self.potential, i, resolved)
+      potential = resolved
+    return potential
+
+  def add_potential(self, i, rid):
+    # Record that unknown cell *i* borders white region *rid*, which must be a live region's id.
+    if rid not in self.potential[i]:
+      self._write(self.potential, i, self.potential[i] | {rid})
+      self._write(self.frontier, rid, self.frontier[rid] | {i})
+      if self.origin[rid] >= 0:
+        self._add_master(i, self.origin[rid])
+
+  def _add_master(self, i, origin):
+    master = self.masters[i]
+    if master != origin and master != MANY:
+      self._write(self.masters, i, origin if master == NO_REGION else MANY)
+
+  def frontier_of(self, rid):
+    # Ids of the unknown cells white region *rid* borders.
+    frontier = self.frontier[rid]
+    color = self.color
+    if any(color[i] != unknown for i in frontier):
+      frontier = frozenset(i for i in frontier if color[i] == unknown)
+      self._write(self.frontier, rid, frontier)
+    return frontier
+
+  def borders_other_island(self, i, rid):
+    # Whether unknown cell *i* borders an island other than region *rid*, so that *rid* can't take it in.
+    master = self.masters[i]
+    return master == MANY or (master >= 0 and master != self.origin[rid])
+
+  def annexed_size(self, i, rid, taken=()):
+    # Number of cells region *rid* would gain by taking in unknown cell *i*: *i* and every other region it borders, but
+    # for those whose id is in *taken* (region ids, or cell ids of regions already taken in whole).
+    count = self.count
+    return 1 + sum(count[r] for r in self.potential_of(i) if r != rid and r not in taken)
+
+  def live_regions(self, color=None):
+    # Ids of live regions in id order, optionally only those of *color*.
+    parent = self.parent
+    if color is None:
+      return [rid for rid in range(self.size) if parent[rid] == rid]
+    return [rid for rid in range(self.size) if parent[rid] == rid and self.color[rid] == color]
+
+  def new_region(self, unit, size_limit=NO_LIMIT, origin=-1):
+    # Found a region on the cell ids in *unit*, all of which must be colored and regionless.
+    unit = sorted(unit)
+    rid = unit[0]
+    write = self._write
+    for i, nxt in zip(unit, unit[1:] + unit[:1]):
+      write(self.parent, i, rid)
+      write(self.link, i, nxt)
+      if self.potential[i]:
+        write(self.potential, i, EMPTY)
+    write(self.count, rid, len(unit))
+    write(self.size_limit, rid, size_limit)
+    write(self.origin, rid, origin)
+    return rid
+
+  def annex(self, rid, other):
+    # Merge the regions of *rid* and *other*, union by size. Returns the id of the merged region.
+    rid, other = self.find(rid), self.find(other)
+    if rid == other:
+      return rid
+    if self.origin[rid] >= 0 and self.origin[other] >= 0:
+      raise Contradiction("Cannot merge two regions with defined size_limits.")
+    assert self.color[rid] == self.color[other], "Cannot merge two regions of different colors."
+
+    if self.color[rid] == white:
+      frontier = self.frontier
+      if (self.origin[rid] >= 0) != (self.origin[other] >= 0):    # the cells next to the clueless one now border an island
+        island, plain = (rid, other) if self.origin[rid] >= 0 else (other, rid)
+        for i in self.frontier_of(plain):
+          self._add_master(i, self.origin[island])
+      merged = frontier[rid] | frontier[other]
+    if self.count[rid] < self.count[other]:
+      rid, other = other, rid
+    write, link = self._write, self.link
+    if self.color[rid] == white:
+      write(self.frontier, rid, merged)
+      write(self.frontier, other, EMPTY)
+    write(self.parent, other, rid)
+    write(self.count, rid, self.count[rid] + self.count[other])
+    rid_next, other_next = link[rid], link[other]
+    write(link, rid, other_next)    # splice the circular member lists
+    write(link, other, rid_next)
+    if self.origin[other] >= 0:
+      write(self.size_limit, rid, self.size_limit[other])
+      write(self.origin, rid, self.origin[other])
+    return rid
+
+  def paint(self, ids, color):
+    # Color the unknown cells in *ids* and merge them into the same-colored regions they touch.
+    write, cell_color = self._write, self.color
+    if self.changes is not None:
+      self.changes.extend(ids)
+    for i in ids:
+      write(cell_color, i, color)
+      if color == white:
+        write(self.label, i, BULLET)
+      self.new_region((i,))
+
+    if color == white:
+      for i in ids:
+        for n in self.nbors[i]:
+          if cell_color[n] == unknown:
+            self.add_potential(n, i)    # before any merge, while *i* is its region's id; potential_of resolves it later
+    for i in ids:
+      for n in self.nbors[i]:
+        if cell_color[n] == color:
+          self.annex(i, n)
@@ -0,0 +1,92 @@
+from collections import Counter
+from functools import wraps
+from time import perf_counter
+import json
+
+COUNTED_CALLS = ('neighbors', 'group_neighbors', '_group_neighbor_ids', 'find_reach_white', '_reach_layers')
+
+
+def count_calls(board, name):
+  # Bound method *name* of *board* that tallies its calls in board.call_counts.
+  method = getattr(type(board), name).__get__(board)
+  counts = board.call_counts
+
+  @wraps(method)
+  def counted(*args, **kwargs):
+    counts[name] += 1
+    return method(*args, **kwargs)
+  return counted
+
+
+class Observer:
+  # Hooks a Board calls while solving, once attached with Board.observe(). All times are perf_counter() seconds.
+
+  def solve_start(self, board):
+    pass
+
+  def rule(self, board, rule, start, elapsed, decided, calls):
+    # One invocation of inference *rule* that set *decided* cells. *calls* counts the helper calls it made (COUNTED_CALLS).
+    pass
+
+  def search(self, board, start, elapsed, stats):
+    # A backtracking search finished with SearchStats *stats*.
+    pass
+
+  def solve_end(self, board, start, elapsed, cycles, status):
+    pass
+
+
+class Tracer(Observer):
+  # Observer that records every event for export as JSONL or as a Chrome trace (chrome://tracing, Perfetto).
+
+  def __init__(self):
+    self.origin = perf_counter()
+    self.events = []
+
+  def _add(self, event, name, start, elapsed, **args):
+    self.events.append({'event': event, 'name': name, 'ts': start - self.origin, 'dur': elapsed, **args})
+
+  def rule(self, board, rule, start, elapsed, decided, calls):
+    self._add('rule', rule, start, elapsed, decided=decided, calls=calls)
+
+  def search(self, board, start, elapsed, stats):
+    self._add('search', 'backtrack', start, elapsed, **stats.simple())
+
+  def solve_end(self, board, start, elapsed, cycles, status):
+    self._add('solve', 'solve', start, elapsed, cycles=cycles, status=status)
+
+  def summary(self):
+    # Per rule: invocations, total seconds, cells decided and helper calls.
+    totals = {}
+    for event in self.events:
+      if event['event'] == 'rule':
+        total = totals.setdefault(event['name'], {'invocations': 0, 'time': 0.0, 'decided': 0, 'calls': Counter()})
+        total['invocations'] += 1
+        total['time'] += event['dur']
+        total['decided'] += event['decided']
+        total['calls'].update(event['calls'])
+    return totals
+
+  def write_jsonl(self, filename):
+    with open(filename, 'w') as write_file:
+      for event in self.events:
+        write_file.write(json.dumps(event) + '\n')
+
+  def chrome_trace(self):
+    return {'traceEvents': [
+              {
+                'name': event['name'],
+                'cat': event['event'],
+                'ph': 'X',
+                'ts': event['ts'] * 1e6,
+                'dur': event['dur'] * 1e6,
+                'pid': 1,
+                'tid': 1,
+                'args': {key: value for key, value in event.items() if key not in ('event', 'name', 'ts', 'dur')},
+              }
+              for event in self.events
+            ]}
+
+  def write_chrome_trace(self, filename):
+    with open(filename, 'w') as write_file:
+      json.dump(self.chrome_trace(), write_file)
@@ -0,0 +1,36 @@
+import json
+
+from board import Board
+from instrument import *
+from propagation import RULES
+
+
+def test_tracer_records_rules(GRID_1_LIST):
+    tracer = Tracer()
+    board = Board(GRID_1_LIST).observe(tracer)
+    board.solve()
+    assert board.is_solved(), "observed solve failed"
+    assert tracer.events[-1]['event'] == 'solve' and tracer.events[-1]['status'] == 'solved', "missing solve event"
+    summary = tracer.summary()
+    assert set(summary) == set(RULES), "missing rule events"
+    assert sum(total['decided'] for total in summary.values()) == 25 - 4, "decided cells don't add up"
+    assert summary['find_unreachable']['calls']['_reach_layers'] > 0, "reach calls not counted"
+
+
+def test_tracer_exports(GRID_1_LIST, tmp_path):
+    tracer = Tracer()
+    Board(GRID_1_LIST).observe(tracer).solve()
+    tracer.write_jsonl(tmp_path / 'trace.jsonl')
+    with open(tmp_path / 'trace.jsonl') as read_file:
+        assert [json.loads(line) for line in read_file] == tracer.events, "jsonl export failed"
+    tracer.write_chrome_trace(tmp_path / 'trace.json')
+    with open(tmp_path / 'trace.json') as read_file:
+        events = json.load(read_file)['traceEvents']
+    assert len(events) == len(tracer.events) and all(event['ph'] == 'X' for event in events), "chrome trace export failed"
+
+
+def test_observe_detach(GRID_1_LIST):
+    board = Board(GRID_1_LIST).observe(Observer())
+    assert 'neighbors' in board.__dict__, "calls not counted"
+    board.observe(None)
+    assert 'neighbors' not in board.__dict__ and board.observer is None, "observer not detached"
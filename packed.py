@@ -0,0 +1,281 @@
+from array import array
+import argparse
+import json
+import mmap
+import struct
+import tempfile
+
+from board import Board
+
+# A packed corpus file is
+#   header       HEADER: magic, version, number of sections, number of records, offsets of the index and the id blob
+#   sections     SECTION for each board size: width, height, bytes per clue, bytes per record, record count, data offset
+#   records      per section, fixed-size records: width*height clues (1 or 2 bytes each), then
+#                width*height solution colors (gridstate's unknown/white/black, all unknown if there is no solution),
+#                padded to a multiple of the clue size
+#   index        INDEX_ENTRY per record, sorted by id: offset and length of the id in the blob, section, slot
+#   id blob      the ids, UTF-8
+# Every section starts on an 8-byte boundary. Numbers are little-endian, like the machines this runs on: the reader
+# casts 2-byte clues with memoryview.cast, which uses the native byte order.
+SUFFIX = '.nkb'
+MAGIC = b'NKBP'
+VERSION = 1
+HEADER = struct.Struct('<4sHHQQQ')
+SECTION = struct.Struct('<HHHHQQ')
+INDEX_ENTRY = struct.Struct('<QHHI')
+
+
+class PuzzleView:
+  # One record of a PackedReader. *clues* and *colors* are memoryviews into the file, in cell id order (y*width + x).
+
+  __slots__ = ('id', 'width', 'height', 'clues', 'colors')
+
+  def __init__(self, puzzle_id, width, height, clues, colors):
+    self.id = puzzle_id
+    self.width = width
+    self.height = height
+    self.clues = clues
+    self.colors = colors
+
+  def __repr__(self):
+    return f"<PuzzleView {self.id} {self.width}x{self.height}>"
+
+  def grid(self):
+    clues, w = self.clues.tolist(), self.width
+    return [clues[y*w:(y+1)*w] for y in range(self.height)]
+
+  def solution(self):
+    # Colors as a grid like Board.get_list_form(), or None if the record has none.
+    colors, w = self.colors.tolist(), self.width
+    if not any(colors):
+      return None
+    return [colors[y*w:(y+1)*w] for y in range(self.height)]
+
+  def board(self):
+    # A Board of the puzzle with the record's colors painted in.
+    return Board(self.grid()).paint_solution(self.solution() or [])
+
+
+class PackedWriter:
+  # Writes a packed corpus to *path*. Records are spooled to a temporary file per board size until close().
+
+  def __init__(self, path):
+    self.path = path
+    self.sections = {}    # (width, height) -> [temporary file, record count]
+    self.ids = {}         # id -> (width, height, slot)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    if exc_info[0] is None:
+      self.close()
+    else:
+      for spool, _ in self.sections.values():
+        spool.close()
+
+  def add(self, puzzle_id, grid, solution=None):
+    puzzle_id = str(puzzle_id)
+    if puzzle_id in self.ids:
+      raise ValueError(f"duplicate puzzle id {puzzle_id!r}")
+    width, height = len(grid[0]), len(grid)
+    section = self.sections.get((width, height))
+    if section is None:
+      section = self.sections[(width, height)] = [tempfile.TemporaryFile(), 0]
+    clues = array('H', [clue for row in grid for clue in row])
+    colors = bytes(color for row in solution for color in row) if solution else bytes(width*height)
+    section[0].write(clues.tobytes())
+    section[0].write(colors)
+    self.ids[puzzle_id] = (width, height, section[1])
+    section[1] += 1
+
+  def add_board(self, puzzle_id, board):
+    # Record *board*'s clues and its colors so far.
+    self.add(puzzle_id, board.get_clue_form(), board.get_list_form())
+
+  def close(self):
+    # Records were spooled with 2-byte clues; sections whose clues all fit in a byte are narrowed while copying.
+    sizes = sorted(self.sections)
+    section_number = {size: k for k, size in enumerate(sizes)}
+    offset = _align(HEADER.size + SECTION.size*len(sizes))
+    layout = []
+    for width, height in sizes:
+      spool, count = self.sections[(width, height)]
+      n = width*height
+      spool.seek(0)
+      clue_size = 1
+      while chunk := spool.read(3*n*1024):
+        for start in range(0, len(chunk), 3*n):
+          if max(array('H', chunk[start:start+2*n])) > 255:
+            clue_size = 2
+      record_size = _align(n*clue_size + n, clue_size)
+      layout.append((width, height, clue_size, record_size, count, offset))
+      offset = _align(offset + record_size*count)
+
+    with open(self.path, 'wb') as out:
+      index_offset = offset
+      blob_offset = index_offset + INDEX_ENTRY.size*len(self.ids)
+      out.write(HEADER.pack(MAGIC, VERSION, len(sizes), len(self.ids), index_offset, blob_offset))
+      for entry in layout:
+        out.write(SECTION.pack(*entry))
+      for (width, height), (_, _, clue_size, record_size, count, offset) in zip(sizes, layout):
+        spool = self.sections[(width, height)][0]
+        n = width*height
+        out.write(bytes(offset - out.tell()))
+        spool.seek(0)
+        for _ in range(count):
+          record = spool.read(3*n)
+          clues = record[:2*n] if clue_size == 2 else bytes(array('H', record[:2*n]).tolist())
+          out.write(clues + record[2*n:] + bytes(record_size - n*clue_size - n))
+        spool.close()
+      out.write(bytes(index_offset - out.tell()))
+      blob = bytearray()
+      for puzzle_id in sorted(self.ids, key=lambda puzzle_id: puzzle_id.encode()):
+        width, height, slot = self.ids[puzzle_id]
+        encoded = puzzle_id.encode()
+        out.write(INDEX_ENTRY.pack(len(blob), len(encoded), section_number[(width, height)], slot))
+        blob += encoded
+      out.write(blob)
+    self.sections.clear()
+
+
+class PackedReader:
+  # Memory-mapped view of a packed corpus. Look records up by id with reader[puzzle_id] (a binary search of the
+  # index), or iterate over them in id order. The views share the file's memory, so release them before close().
+
+  def __init__(self, path):
+    self.path = path
+    self._file = open(path, 'rb')
+    self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, section_count, self.count, self._index, self._blob = HEADER.unpack_from(self._map, 0)
+    if magic != MAGIC or version != VERSION:
+      raise ValueError(f"{path} is not a version {VERSION} packed corpus")
+    self.sections = [SECTION.unpack_from(self._map, HEADER.size + k*SECTION.size) for k in range(section_count)]
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.close()
+
+  def close(self):
+    self._map.close()
+    self._file.close()
+
+  def __len__(self):
+    return self.count
+
+  def _entry(self, k):
+    # (id bytes, section, slot) of the k-th record in id order.
+    blob_start, id_size, section, slot = INDEX_ENTRY.unpack_from(self._map, self._index + k*INDEX_ENTRY.size)
+    start = self._blob + blob_start
+    return self._map[start:start+id_size], section, slot
+
+  def _view(self, puzzle_id, section, slot):
+    width, height, clue_size, record_size, _, offset = self.sections[section]
+    n = width*height
+    start = offset + slot*record_size
+    record = memoryview(self._map)[start:start+record_size]
+    clues = record[:n*clue_size].cast('H') if clue_size == 2 else record[:n]
+    return PuzzleView(puzzle_id, width, height, clues, record[n*clue_size:n*clue_size+n])
+
+  def __getitem__(self, puzzle_id):
+    encoded = str(puzzle_id).encode()
+    lo, hi = 0, self.count
+    while lo < hi:
+      mid = (lo + hi) // 2
+      if self._entry(mid)[0] < encoded:
+        lo = mid + 1
+      else:
+        hi = mid
+    if lo < self.count:
+      found, section, slot = self._entry(lo)
+      if found == encoded:
+        return self._view(str(puzzle_id), section, slot)
+    raise KeyError(puzzle_id)
+
+  def get(self, puzzle_id, default=None):
+    try:
+      return self[puzzle_id]
+    except KeyError:
+      return default
+
+  def __contains__(self, puzzle_id):
+    return self.get(puzzle_id) is not None
+
+  def __iter__(self):
+    for k in range(self.count):
+      encoded, section, slot = self._entry(k)
+      yield self._view(encoded.decode(), section, slot)
+
+
+def _align(offset, boundary=8):
+  return -(-offset // boundary) * boundary
+
+
+def pack(paths, out_path, solutions=None):
+  # Pack the puzzles in the JSON/JSONL files *paths* (see batch.read_puzzles) into *out_path*, with the solutions from
+  # the batch result files *solutions*, matched by id. Returns the number of puzzles packed.
+  from batch import read_puzzles    # not at the top, since batch reads packed files with PackedReader
+  solved = {}
+  for path in solutions or ():
+    with open(path, 'r') as read_file:
+      for line in read_file:
+        if line.strip():
+          record = json.loads(line)
+          if record.get('solution'):
+            solved[record['id']] = record['solution']
+  with PackedWriter(out_path) as writer:
+    for puzzle_id, grid in read_puzzles(*paths):
+      writer.add(puzzle_id, grid, solved.get(puzzle_id))
+    return len(writer.ids)
+
+
+def unpack(path, out_path):
+  # Write the records of the packed corpus *path* as a JSON list of {'id', 'grid'} objects, plus 'solution' if they
+  # have one. batch.read_puzzles reads the result.
+  with PackedReader(path) as reader, open(out_path, 'w') as write_file:
+    write_file.write('[')
+    for k, view in enumerate(reader):
+      puzzle = {'id': view.id, 'grid': view.grid()}
+      if (solution := view.solution()) is not None:
+        puzzle['solution'] = solution
+      write_file.write((',\n' if k else '') + json.dumps(puzzle))
+      del view    # PackedReader.close() fails while views are alive
+    write_file.write(']\n')
+    return len(reader)
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Convert puzzles between JSON and the packed binary corpus format.")
+  commands = parser.add_subparsers(dest='command', required=True)
+  pack_parser = commands.add_parser('pack', help="pack JSON/JSONL puzzle files")
+  pack_parser.add_argument('paths', nargs='+')
+  pack_parser.add_argument('-o', '--output', required=True)
+  pack_parser.add_argument('-s', '--solutions', nargs='*', help="batch result files (JSONL) to take solutions from")
+  unpack_parser = commands.add_parser('unpack', help="unpack to a JSON list")
+  unpack_parser.add_argument('path')
+  unpack_parser.add_argument('-o', '--output', required=True)
+  board_parser = commands.add_parser('board', help="pack a board dump, or dump one record as a board")
+  board_parser.add_argument('path', help="a board dump (see Board.dump) or a packed corpus")
+  board_parser.add_argument('-o', '--output', required=True)
+  board_parser.add_argument('--id', help="record to dump, when *path* is a packed corpus; the id to pack it as otherwise")
+  args = parser.parse_args(argv)
+
+  if args.command == 'pack':
+    print(f"Packed {pack(args.paths, args.output, args.solutions)} puzzles into {args.output}.")
+  elif args.command == 'unpack':
+    print(f"Unpacked {unpack(args.path, args.output)} puzzles into {args.output}.")
+  elif args.path.endswith(SUFFIX):
+    with PackedReader(args.path) as reader:
+      board = reader[args.id].board()
+    board.dump(args.output)
+  else:
+    with open(args.path, 'r') as read_file:
+      board = Board(jobj=json.load(read_file))
+    with PackedWriter(args.output) as writer:
+      writer.add_board(args.id or args.path, board)
+
+
+if __name__ == '__main__':
+  main()
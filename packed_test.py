@@ -0,0 +1,48 @@
+import json
+
+from batch import read_puzzles
+from board import Board
+from packed import *
+
+GRID_WIDE = [[300] + [0]*19 for _ in range(1)] + [[0]*20 for _ in range(15)]
+
+
+def test_round_trip(GRID_1_LIST, SOL_1_LIST, tmp_path):
+    path = str(tmp_path / 'corpus.nkb')
+    with PackedWriter(path) as writer:
+        writer.add('b', GRID_1_LIST, SOL_1_LIST)
+        writer.add('a', GRID_1_LIST)
+        writer.add('wide', GRID_WIDE)
+    with PackedReader(path) as reader:
+        assert len(reader) == 3 and [view.id for view in reader] == ['a', 'b', 'wide'], "index out of order"
+        assert reader['b'].grid() == GRID_1_LIST and reader['b'].solution() == SOL_1_LIST, "record changed"
+        assert reader['a'].solution() is None, "phantom solution"
+        assert reader['wide'].grid() == GRID_WIDE, "2-byte clues changed"
+        assert 'c' not in reader, "found a missing id"
+        assert reader['b'].board().is_solved(), "board() lost colors"
+
+
+def test_pack_unpack(GRID_1_LIST, SOL_1_LIST, tmp_path):
+    source = tmp_path / 'puzzles.json'
+    source.write_text(json.dumps([{'id': 'x', 'grid': GRID_1_LIST}, GRID_1_LIST]))
+    solutions = tmp_path / 'results.jsonl'
+    solutions.write_text(json.dumps({'id': 'x', 'solution': SOL_1_LIST}) + '\n')
+    packed = str(tmp_path / 'puzzles.nkb')
+    assert pack([str(source)], packed, [str(solutions)]) == 2, "pack lost puzzles"
+    assert sorted(read_puzzles(packed)) == sorted(read_puzzles(str(source))), "read_puzzles differs on packed file"
+    puzzles = read_puzzles(packed, skip={'x'})
+    assert next(puzzles)[0] == f'{source}:1', "read_puzzles didn't skip"
+    puzzles.close()     # closes the reader, which fails if a view of it is still alive
+    unpack(packed, str(tmp_path / 'out.json'))
+    unpacked = json.loads((tmp_path / 'out.json').read_text())
+    assert {p['id']: p.get('solution') for p in unpacked} == {'x': SOL_1_LIST, f'{source}:1': None}, "unpack failed"
+
+
+def test_board_dump_conversion(GRID_1_LIST, tmp_path):
+    board = Board(GRID_1_LIST)
+    board.find_unreachable()
+    board.dump(str(tmp_path / 'last_board.json'))
+    main(['board', str(tmp_path / 'last_board.json'), '-o', str(tmp_path / 'board.nkb'), '--id', 'last'])
+    main(['board', str(tmp_path / 'board.nkb'), '-o', str(tmp_path / 'again.json'), '--id', 'last'])
+    with open(tmp_path / 'again.json') as read_file:
+        assert Board(jobj=json.load(read_file)) == board, "board dump conversion changed colors"
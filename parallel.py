@@ -0,0 +1,84 @@
+import pickle
+
+from expansion import ExpansionEngine
+from gridstate import white
+from propagation import Propagator
+
+_pools = {}   # number of workers -> ProcessPoolExecutor shared by every board using that many
+_engines = {}   # in a worker: (node_limit, cache_size) -> its ExpansionEngine with those settings
+
+
+def get_pool(workers):
+  pool = _pools.get(workers)
+  if pool is None:
+    from concurrent.futures import ProcessPoolExecutor    # only boards with workers need it
+    pool = _pools[workers] = ProcessPoolExecutor(workers)
+  return pool
+
+
+def _board(payload):
+  # A Board over the pickled GridState *payload*, in a worker.
+  from board import Board   # not at the top, since board imports this module
+  board = Board()
+  board._attach(pickle.loads(payload))
+  return board
+
+
+def reach_chunk(payload, rids):
+  # Board._reach_layers for each island in *rids* of the snapshot *payload*.
+  board = _board(payload)
+  return [board._reach_layers(rid) for rid in rids]
+
+
+def expansion_chunk(payload, rids, node_limit, cache_size):
+  # ExpansionEngine.common_cells for each island in *rids* of the snapshot *payload*, using the worker's engine with the
+  # settings of the board's (see Board.expansion_engine). Its cache is kept between tasks.
+  engine = _engines.get((node_limit, cache_size))
+  if engine is None:
+    engine = _engines[node_limit, cache_size] = ExpansionEngine(node_limit, cache_size)
+  state = pickle.loads(payload)
+  return [engine.common_cells(state, rid) for rid in rids]
+
+
+class ParallelPropagator(Propagator):
+  # Propagator for boards with *workers* set. When at least *min_islands* islands are dirty, find_unreachable and
+  # expand_white work out every dirty island's reach or common cells at once, spread over a pool of worker processes
+  # that each get a pickled snapshot of the state, and then apply what they found in island order: find_unreachable
+  # as usual, expand_white in one set_color. Fewer dirty islands than that are handled here, like Propagator does.
+  # Shells from earlier rounds aren't reused, since every island is recomputed from the snapshot in the workers.
+
+  def __init__(self, board, workers, min_islands=8):
+    super().__init__(board)
+    self.workers = workers
+    self.min_islands = min_islands
+
+  def _map(self, task, rids, *args):
+    # [task(snapshot, chunk, *args) results for the chunks of *rids*], flattened, in the order of *rids*.
+    payload = pickle.dumps(self.state.snapshot(), pickle.HIGHEST_PROTOCOL)
+    size = -(-len(rids) // self.workers)
+    pool = get_pool(self.workers)
+    futures = [pool.submit(task, payload, rids[start:start+size], *args) for start in range(0, len(rids), size)]
+    return [result for future in futures for result in future.result()]
+
+  def _recompute_reach(self, dirty):
+    if len(dirty) < self.min_islands:
+      return super()._recompute_reach(dirty)
+    islands = [island for island, _ in dirty]
+    find = self.state.find
+    return zip(islands, self._map(reach_chunk, [find(island) for island in islands]))
+
+  def expand_white(self):
+    find, state = self.state.find, self.state
+    growing = [island for island in sorted(self.dirty_expand) if state.count[find(island)] < state.size_limit[find(island)]]
+    if len(growing) < self.min_islands:
+      return super().expand_white()
+    counter = self.counters['expand_white']
+    counter['runs'] += 1
+    counter['work'] += len(growing)
+    self.dirty_expand.clear()
+    common = set()
+    engine = self.board.expansion_engine
+    for cells in self._map(expansion_chunk, [find(island) for island in growing], engine.node_limit, engine.cache_size):
+      common.update(cells or ())
+    cell_list = self.board.cell_list
+    self._decide('expand_white', white, [cell_list[i] for i in sorted(common)])
@@ -1,40 +1,82 @@
 
 class Pathtree:
+    # A tree of the ways a path can grow from its root unit: every root-to-leaf path is one way.
+    # A unit can be a single cell or a set of contiguous cells in a Region; units are stored as frozensets, and a node
+    # keeps at most one kid per unit, found through *kid_units*.
+    # Every walk over the tree uses an explicit stack, so trees of any depth are fine.
+
+    __slots__ = ('unit', 'parent', 'kids', 'kid_units')
 
     def __init__(self, unit, parent=None):
-        # A unit can be a single cell or a set of contiguous cells in a Region.
-        self.unit = unit
+        self.unit = frozenset(unit)
         self.parent = parent
-        self.kids = set()
+        self.kids = []
+        self.kid_units = {}     # unit -> kid
+
+    def __repr__(self):
+        return f"<Pathtree {len(self.unit)} cells, {len(self.kids)} kids>"
 
     def add_kid(self, new_kid):
-        if isinstance(new_kid, Pathtree):
-            if new_kid.unit not in {kid.unit for kid in self.kids}:
-                self.kids.add(new_kid)
-        else:
-            if new_kid not in {kid.unit for kid in self.kids}:
-                self.kids.add(Pathtree(new_kid, self))
+        # Add *new_kid*, a Pathtree or a unit, unless there's a kid with the same unit already.
+        unit = new_kid.unit if isinstance(new_kid, Pathtree) else frozenset(new_kid)
+        if unit not in self.kid_units:
+            if not isinstance(new_kid, Pathtree):
+                new_kid = Pathtree(unit)
+            new_kid.parent = self
+            self.kids.append(new_kid)
+            self.kid_units[unit] = new_kid
         return self
 
+    def kid(self, unit):
+        # The kid with *unit*, added first if there isn't one.
+        unit = frozenset(unit)
+        kid = self.kid_units.get(unit)
+        if kid is None:
+            kid = Pathtree(unit, self)
+            self.kids.append(kid)
+            self.kid_units[unit] = kid
+        return kid
+
+    def nodes(self):
+        # Every node of the tree, parents before kids.
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.kids))
 
     def get_path(self):
         # Return path from root to here
-        if parent is None:
-            return (self,)
-        else:
-            return parent.get_path() + (self,) 
+        path = []
+        node = self
+        while node is not None:
+            path.append(node)
+            node = node.parent
+        return tuple(reversed(path))
 
     def get_leaves(self):
-        if not self.kids:
-            return {self}
-        else:
-            return set.union(*[kid.get_leaves() for kid in self.kids])
-
-    def intersection(self):
-        return set.intersection(*[kid.intersection() for kid in self.kids])|self.unit
+        return {node for node in self.nodes() if not node.kids}
 
     def union(self):
-        return set.union(*[kid.union() for kid in self.kids])|self.unit
+        # Every cell in the tree.
+        return set().union(*(node.unit for node in self.nodes()))
+
+    def intersection(self):
+        # The cells on every root-to-leaf path.
+        common = {}    # node -> cells on every path from it down to a leaf
+        for node in reversed(list(self.nodes())):    # kids before parents
+            below = set.intersection(*(common.pop(kid) for kid in node.kids)) if node.kids else set()
+            common[node] = below | node.unit
+        return common[self]
 
     def expansions(self):
-        return {set.union(*(node.unit for node in leaf.get_path())) for leaf in self.get_leaves()}
+        # The cells of each root-to-leaf path, as a set of frozensets.
+        found = set()
+        stack = [(self, self.unit)]
+        while stack:
+            node, cells = stack.pop()
+            if not node.kids:
+                found.add(cells)
+            for kid in node.kids:
+                stack.append((kid, cells | kid.unit))
+        return found
@@ -0,0 +1,213 @@
+from array import array
+from collections import Counter
+from time import perf_counter
+
+from connectivity import black_cut_cells, single_exits
+from gridstate import unknown, white, black
+
+
+RULES = ('find_unreachable', 'prevent_pools', 'connect_black', 'force_exits', 'expand_white')
+SWEEPS = ('connect_black', 'force_exits')   # rules that check the whole board in one O(n) pass whenever it changed
+
+
+class Interrupted(Exception):
+  # Raised by a Board's *interrupt* callback to abandon a solve. *status* says why, e.g. 'cancelled' or 'timeout'.
+
+  def __init__(self, status='cancelled'):
+    super().__init__(status)
+    self.status = status
+
+
+class Propagator:
+  # Runs a Board's inference rules to a fixpoint, re-running each one only where the board changed.
+  # GridState.paint and GridState.rollback publish the ids of recolored cells in *state.changes*; each pass drains them and
+  #   - marks the 2x2 squares of cells that turned black for prevent_pools,
+  #   - marks the islands whose last known reach includes or borders a changed cell for find_unreachable and expand_white,
+  #   - marks the SWEEPS rules for another pass.
+  # A rollback can give an island back reach anywhere (say by shrinking a clueless white region that blocked it), so after
+  # one every island is recomputed from scratch.
+  # Islands are keyed by the id of their clue cell since a region's id can change when it merges.
+  #
+  # find_unreachable keeps each island's reach as the shells from Board._reach_layers and a per-cell count of the islands
+  # that reach it. A cell turning black only affects the shells from the one it first appeared in, so just those are
+  # recomputed; any other change recomputes the island's reach from scratch. Cells whose count drops to zero are the only
+  # candidates for being unreachable.
+
+  def __init__(self, board):
+    self.board = board
+    self.state = state = board.state
+    state.changes = []
+    self.islands = [i for i in range(state.size) if state.label[i] > 0]
+    self.reach = {}                                     # island -> shells of its reach, see Board._reach_layers
+    self.reach_sets = {}                                # island -> set of cell ids in its reach
+    self.reach_count = array('i', bytes(4*state.size))  # by cell id: number of islands that reach it
+    self.unreached = set(range(state.size))             # cells whose reach_count dropped to zero since find_unreachable last ran
+    self.dirty_reach = dict.fromkeys(self.islands, 0)   # islands find_unreachable must recompute -> first shell to recompute
+    self.dirty_expand = set(self.islands)               # islands expand_white must re-enumerate
+    self.dirty_squares = set(state.geometry.squares)    # squares prevent_pools must check
+    self.dirty_sweeps = set(SWEEPS)                     # SWEEPS rules that must run again
+    self.counters = {rule: {'runs': 0, 'work': 0, 'decided': 0} for rule in RULES}
+    self.counters['rounds'] = 0
+
+  def is_settled(self):
+    return not (self.state.changes or self.dirty_reach or self.dirty_expand or self.dirty_squares or self.dirty_sweeps)
+
+  def run(self):
+    # Apply the rules until nothing is left to re-check. Returns the number of rounds.
+    # The board's *interrupt* callback, if any, is polled before every rule and stops the run by raising Interrupted.
+    rounds = 0
+    interrupt = self.board.interrupt
+    self.collect()
+    while not self.is_settled():
+      rounds += 1
+      for rule in RULES:
+        if interrupt is not None:
+          interrupt()
+        self.invoke(rule)
+        self.collect()
+    self.counters['rounds'] += rounds
+    return rounds
+
+  def invoke(self, rule):
+    # Run *rule*, reporting it to the board's observer if it has one.
+    observer = self.board.observer
+    if observer is None:
+      getattr(self, rule)()
+      return
+    board, counter = self.board, self.counters[rule]
+    decided, calls = counter['decided'], dict(board.call_counts)
+    start = perf_counter()
+    getattr(self, rule)()
+    elapsed = perf_counter() - start
+    calls = {name: count - calls.get(name, 0) for name, count in board.call_counts.items() if count != calls.get(name, 0)}
+    observer.rule(board, rule, start, elapsed, counter['decided'] - decided, calls)
+
+  def collect(self):
+    # Turn published changes into dirty islands and squares.
+    state = self.state
+    if not state.changes:
+      return
+    changes = Counter(state.changes)
+    state.changes.clear()
+    self.dirty_sweeps.update(SWEEPS)
+    color, nbors, cell_squares = state.color, state.nbors, state.geometry.cell_squares
+    painted_black = set()   # recolored once since the last collect, and black now, so they went from unknown to black
+    others = set()          # turned white, were restored by a rollback, or were recolored more than once
+    for i, times in changes.items():
+      if color[i] == black:
+        self.dirty_squares.update(cell_squares[i])
+      elif color[i] == unknown:
+        self.unreached.add(i)   # a rollback may restore a cell no island reaches without changing its reach_count
+      (painted_black if times == 1 and color[i] == black else others).add(i)
+    if state.rolled_back:
+      self.reset_islands()
+      return
+    touched = set(changes)
+    for i in changes:
+      touched.update(nbors[i])
+    others_touched = set(others)
+    for i in others:
+      others_touched.update(nbors[i])
+
+    dirty_reach = self.dirty_reach
+    for island in self.islands:
+      reach_set = self.reach_sets.get(island)
+      if reach_set is None or touched.isdisjoint(reach_set):
+        continue
+      self.dirty_expand.add(island)
+      layers = self.reach[island]
+      if not others_touched.isdisjoint(reach_set):
+        restart = 0    # potentials and region members the shells depend on may have changed
+      else:
+        restart = min((next(k for k, layer in enumerate(layers) if i in layer) for i in painted_black & reach_set), default=len(layers))
+      if restart < len(layers):
+        dirty_reach[island] = min(restart, dirty_reach.get(island, restart))
+
+  def reset_islands(self):
+    # Have find_unreachable and expand_white redo every island from scratch, as after a rollback.
+    self.state.rolled_back = False
+    self.dirty_reach = dict.fromkeys(self.islands, 0)
+    self.dirty_expand.update(self.islands)
+
+  def _decide(self, rule, color, cells):
+    if cells:
+      self.counters[rule]['decided'] += len(cells)
+      self.board.set_color(color, *cells)
+
+  def find_unreachable(self):
+    # Set all Cells that can't be reached by any islands to black.
+    state, counter = self.state, self.counters['find_unreachable']
+    counter['runs'] += 1
+    reach_count = self.reach_count
+    for island, layers in self._recompute_reach(sorted(self.dirty_reach.items())):
+      counter['work'] += 1
+      new = set().union(*layers)
+      old = self.reach_sets.get(island, set())
+      for i in old - new:
+        reach_count[i] -= 1
+        if not reach_count[i]:
+          self.unreached.add(i)
+      for i in new - old:
+        reach_count[i] += 1
+      self.reach[island], self.reach_sets[island] = layers, new
+      del self.dirty_reach[island]
+    color, cell_list = state.color, self.board.cell_list
+    unreachable = [cell_list[i] for i in sorted(self.unreached) if not reach_count[i] and color[i] == unknown]
+    self.unreached.clear()
+    self._decide('find_unreachable', black, unreachable)
+
+  def _recompute_reach(self, dirty):
+    # Yield (island, shells of its reach) for each (island, first shell to recompute) in *dirty*.
+    find = self.state.find
+    for island, restart in dirty:
+      yield island, self.board._reach_layers(find(island), known=self.reach.get(island), restart=restart)
+
+  def prevent_pools(self):
+    # Find any unknown Cells that are part of a 2x2 square where the other Cells are black and set them to white.
+    state, counter = self.state, self.counters['prevent_pools']
+    counter['runs'] += 1
+    color = state.color
+    pool_breakers = set()
+    for square in self.dirty_squares:
+      counter['work'] += 1
+      nonblack = [c for c in square if color[c] != black]
+      if len(nonblack) == 1 and color[nonblack[0]] == unknown:
+        pool_breakers.add(nonblack[0])
+    self.dirty_squares.clear()
+    cell_list = self.board.cell_list
+    self._decide('prevent_pools', white, [cell_list[i] for i in sorted(pool_breakers)])
+
+  def connect_black(self):
+    # Set the unknown Cells that black needs to stay connected to black.
+    counter = self.counters['connect_black']
+    counter['runs'] += 1
+    if 'connect_black' in self.dirty_sweeps:
+      counter['work'] += 1
+      self.dirty_sweeps.discard('connect_black')
+      cell_list = self.board.cell_list
+      self._decide('connect_black', black, [cell_list[i] for i in black_cut_cells(self.state)])
+
+  def force_exits(self):
+    # Give every region that must grow and has a single unknown neighbor that neighbor's color.
+    counter = self.counters['force_exits']
+    counter['runs'] += 1
+    if 'force_exits' in self.dirty_sweeps:
+      counter['work'] += 1
+      self.dirty_sweeps.discard('force_exits')
+      to_white, to_black = single_exits(self.state)
+      cell_list = self.board.cell_list
+      self._decide('force_exits', white, [cell_list[i] for i in to_white])
+      self._decide('force_exits', black, [cell_list[i] for i in to_black])
+
+  def expand_white(self):
+    # Set the unknown Cells that every expansion of an island needs to white.
+    state, counter = self.state, self.counters['expand_white']
+    counter['runs'] += 1
+    find = state.find
+    for island in sorted(self.dirty_expand):
+      self.dirty_expand.discard(island)
+      rid = find(island)
+      if state.count[rid] == state.size_limit[rid]:
+        continue
+      counter['work'] += 1
+      self._decide('expand_white', white, self.board._expansion_commons(rid))
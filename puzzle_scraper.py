@@ -5,7 +5,7 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.firefox.options import Options
 
 from math import sqrt
-from json import dump
+from json import dumps
 
 def download_puzzles(count=5, size=5, difficulty='Normal'):
 
@@ -31,7 +31,6 @@ def download_puzzles(count=5, size=5, difficulty='Normal'):
     options = Options()
     options.headless = True
 
-    board_lists = []
     with webdriver.Firefox(firefox_options=options, executable_path=r'M:\\Program Files\\geckodriver.exe') as driver:
         for _ in range(count):
             driver.get(f'https://www.puzzle-nurikabe.com/{url_query}')
@@ -56,12 +55,14 @@ def download_puzzles(count=5, size=5, difficulty='Normal'):
                     else:
                         raise Exception(f"Unrecognized cell element: {cell_element}")
                 board_list.append(board_row)
-            board_lists.append(board_list)
-    return board_lists
+            yield board_list
 
 def save_puzzle_cases(count=5, size=5, difficulty='Normal'):
+    # Write each puzzle as soon as it's downloaded, one per line (see stream.read_stream).
     with open('puzzles.json', 'w') as write_file:
-        dump(download_puzzles(count, size, difficulty), write_file)
+        for board_list in download_puzzles(count, size, difficulty):
+            write_file.write(dumps(board_list) + '\n')
+            write_file.flush()
 
 if __name__ == '__main__':
     save_puzzle_cases(size=10, difficulty='Hard')
\ No newline at end of file
@@ -0,0 +1,159 @@
+from html import escape
+import argparse
+import sys
+
+from board_display import CELL_SIDE, COORDS, LINE_WIDTH, WINDOW_BUFFER
+from gridstate import unknown, white, black, NO_LABEL, BULLET
+from stream import JSONStream
+
+FILLS = {unknown: '#d8d8d8', white: 'white', black: 'black'}
+ANSI = {unknown: '\x1b[48;5;250m\x1b[30m', white: '\x1b[107m\x1b[30m', black: '\x1b[40m\x1b[97m'}
+ANSI_RESET = '\x1b[0m'
+TEXT = {unknown: '.', white: ' ', black: '#'}
+
+
+class Picture:
+  # What a renderer needs of a board: its size and, by cell id, colors and label codes (see GridState.label). Built from
+  # a Board it shares the state's buffers, so nothing is copied.
+
+  __slots__ = ('width', 'height', 'colors', 'labels')
+
+  def __init__(self, width, height, colors, labels):
+    self.width = width
+    self.height = height
+    self.colors = colors
+    self.labels = labels
+
+  @classmethod
+  def of_board(cls, board):
+    return cls(board.width, board.height, board.state.color, board.state.label)
+
+  @classmethod
+  def of_grids(cls, colors, clues=None):
+    # From a grid of colors like Board.get_list_form(), and optionally the clue grid.
+    width, height = len(colors[0]), len(colors)
+    labels = [clue for row in clues for clue in row] if clues else [NO_LABEL] * (width*height)
+    return cls(width, height, [color for row in colors for color in row], labels)
+
+  def label(self, i):
+    code = self.labels[i]
+    if code == NO_LABEL:
+      return ''
+    if code == BULLET:
+      return u"\u2022" # bullet
+    return str(code)
+
+
+def to_text(picture):
+  # Rows of '#' for black, '.' for unknown and the label or ' ' for white, columns as wide as the widest label.
+  side = max([1] + [len(picture.label(i)) for i in range(picture.width*picture.height)])
+  lines = []
+  for y in range(picture.height):
+    cells = (picture.label(i) or TEXT[picture.colors[i]] for i in range(y*picture.width, (y+1)*picture.width))
+    lines.append(' '.join(cell.rjust(side) for cell in cells))
+  return '\n'.join(lines)
+
+
+def to_ansi(picture):
+  # Rows of colored blocks for a terminal, labels printed in their cells.
+  side = max([1] + [len(picture.label(i)) for i in range(picture.width*picture.height)]) + 1
+  lines = []
+  for y in range(picture.height):
+    row = ''.join(ANSI[picture.colors[i]] + picture.label(i).center(side)
+                  for i in range(y*picture.width, (y+1)*picture.width))
+    lines.append(row + ANSI_RESET)
+  return '\n'.join(lines)
+
+
+def to_svg(picture, cell_side=CELL_SIDE, coords=COORDS):
+  # An SVG drawing laid out like board_display's window.
+  edge_buffer = WINDOW_BUFFER+LINE_WIDTH+1
+  shift = edge_buffer + (20 if coords else 0)
+  width, height = cell_side*picture.width + edge_buffer + shift, cell_side*picture.height + edge_buffer + shift
+  parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}">',
+           f'<g stroke="black" stroke-width="{LINE_WIDTH}">']
+  for i, color in enumerate(picture.colors):
+    x, y = i % picture.width, i // picture.width
+    parts.append(f'<rect x="{shift + x*cell_side}" y="{shift + y*cell_side}" width="{cell_side}" height="{cell_side}" '
+                 f'fill="{FILLS[color]}"/>')
+  parts.append(f'</g><g font-family="Arial" font-size="{cell_side//3}" text-anchor="middle" dominant-baseline="central">')
+  for i in range(picture.width*picture.height):
+    if label := picture.label(i):
+      x, y = i % picture.width, i // picture.width
+      parts.append(f'<text x="{shift + (x+.5)*cell_side:g}" y="{shift + (y+.5)*cell_side:g}">{escape(label)}</text>')
+  parts.append('</g>')
+  if coords:
+    parts.append('<g font-family="Arial" font-size="10" text-anchor="middle" dominant-baseline="central">')
+    for row in range(picture.height):
+      parts.append(f'<text x="{WINDOW_BUFFER+10}" y="{shift + (row+.5)*cell_side:g}">{row}</text>')
+    for col in range(picture.width):
+      parts.append(f'<text x="{shift + (col+.5)*cell_side:g}" y="{WINDOW_BUFFER+10}">{col}</text>')
+    parts.append('</g>')
+  parts.append('</svg>')
+  return '\n'.join(parts)
+
+
+RENDERERS = {'text': to_text, 'ansi': to_ansi, 'svg': to_svg}
+
+SHEET_HEAD = '''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title><style>
+body {{ font-family: Arial, sans-serif; }}
+section {{ display: grid; grid-template-columns: repeat({columns}, auto); gap: 12px; justify-content: start; break-after: page; }}
+figure {{ margin: 0; }} figcaption {{ font-size: 12px; }} h2 {{ font-size: 14px; }}
+</style></head><body>
+'''
+
+
+def write_sheet(records, out, clues=None, per_page=24, columns=4, cell_side=CELL_SIDE//3, title="Nurikabe results"):
+  # Write the batch result *records* (see batch.solve_record) to the text file *out* as one HTML page of SVG drawings,
+  # *per_page* to a printed page, as the records come in. *clues* maps puzzle ids to clue grids, for the labels.
+  # Returns the number of records drawn.
+  out.write(SHEET_HEAD.format(title=escape(title), columns=columns))
+  count = 0
+  for record in records:
+    if count % per_page == 0:
+      out.write(('</section>\n' if count else '') + f'<h2>Page {count//per_page + 1}</h2><section>\n')
+    caption = f"{escape(str(record.get('id')))}: {escape(str(record.get('status')))}"
+    if record.get('solution'):
+      picture = Picture.of_grids(record['solution'], (clues or {}).get(record.get('id')))
+      out.write(f'<figure>{to_svg(picture, cell_side, coords=False)}<figcaption>{caption}</figcaption></figure>\n')
+    else:
+      out.write(f'<figure><figcaption>{caption}</figcaption></figure>\n')
+    count += 1
+  out.write(('</section>\n' if count else '') + '</body></html>\n')
+  return count
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Render batch results (JSONL) without a display.")
+  parser.add_argument('results', help="batch result file, or - for stdin")
+  parser.add_argument('-f', '--format', choices=('html',) + tuple(RENDERERS), default='html')
+  parser.add_argument('-o', '--output', default='-', help="default: stdout")
+  parser.add_argument('-p', '--puzzles', nargs='*', help="puzzle files to take clue numbers from, matched by id")
+  parser.add_argument('--per-page', type=int, default=24)
+  parser.add_argument('--columns', type=int, default=4)
+  args = parser.parse_args(argv)
+
+  clues = None
+  if args.puzzles:
+    from batch import read_puzzles
+    clues = dict(read_puzzles(*args.puzzles))
+  source = sys.stdin if args.results == '-' else open(args.results, 'r')
+  out = sys.stdout if args.output == '-' else open(args.output, 'w')
+  try:
+    records = JSONStream(source)
+    if args.format == 'html':
+      write_sheet(records, out, clues, args.per_page, args.columns, title=args.results)
+      return
+    for record in records:
+      if record.get('solution'):
+        out.write(f"{record.get('id')}: {record.get('status')}\n")
+        out.write(RENDERERS[args.format](Picture.of_grids(record['solution'], (clues or {}).get(record.get('id')))) + '\n\n')
+  finally:
+    for stream in (source, out):
+      if stream not in (sys.stdin, sys.stdout):
+        stream.close()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,24 @@
+import io
+
+from board import Board
+from render import *
+
+
+def test_render_board(GRID_1_LIST):
+    board = Board(GRID_1_LIST)
+    assert board.render().splitlines()[2] == '3 . . 2 .', "text render failed"
+    board.propagate()
+    assert board.render().splitlines()[3] == '# # # # 1', "text render failed"
+    svg = board.render('svg')
+    assert svg.count('<rect') == 25 and svg.count('fill="black"') == 16 and '>3</text>' in svg, "svg render failed"
+    assert board.render('ansi').count(ANSI_RESET) == 5, "ansi render failed"
+
+
+def test_write_sheet(GRID_1_LIST):
+    solution = Board(GRID_1_LIST).propagate().get_list_form()
+    records = [{'id': str(k), 'status': 'solved', 'solution': solution} for k in range(5)] + [{'id': 'x', 'status': 'timeout'}]
+    out = io.StringIO()
+    assert write_sheet(iter(records), out, clues={'0': GRID_1_LIST}, per_page=4) == 6
+    html = out.getvalue()
+    assert html.count('<svg') == 5 and html.count('<section>') == 2 and html.count('>3</text>') == 2, "sheet wrong"
+    assert html.endswith('</section>\n</body></html>\n')
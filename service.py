@@ -0,0 +1,199 @@
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+import argparse
+import asyncio
+import json
+import multiprocessing
+import sys
+
+from batch import solve_record
+from propagation import Interrupted
+
+_stop_flags = None    # the worker's view of SolverService.stop_flags
+
+
+def _init_worker(stop_flags):
+  global _stop_flags
+  _stop_flags = stop_flags
+
+
+def _solve(slot, puzzle_id, grid, time_limit, search):
+  # Runs in a worker: solve_record, stopping between rules once the service raises the slot's flag or time runs out.
+  deadline = None if time_limit is None else perf_counter() + time_limit
+
+  def interrupt():
+    if _stop_flags[slot]:
+      raise Interrupted('cancelled')
+    if deadline is not None and perf_counter() > deadline:
+      raise Interrupted('timeout')
+  return solve_record(puzzle_id, grid, time_limit, search, interrupt=interrupt)
+
+
+class ServiceBusy(Exception):
+  pass
+
+
+class SolverService:
+  # Solves puzzles for asyncio code on a pool of *workers* processes, without printing or writing files.
+  # At most *max_pending* solves are in the pool at once, each with a slot in *stop_flags*, shared memory the workers
+  # poll between rules, so cancelling a solve or hitting its timeout stops it mid-solve. Callers beyond that wait for
+  # a slot; with *max_waiting*, callers beyond that many waiting get ServiceBusy.
+  # *metrics* counts submitted, completed, cancelled and timed out solves and rejected callers, tracks how many are
+  # waiting and pending, and the deepest the wait queue has been.
+
+  def __init__(self, workers=None, max_pending=None, max_waiting=None):
+    context = multiprocessing.get_context()
+    self.workers = workers or multiprocessing.cpu_count() or 1
+    self.max_pending = max_pending or 2*self.workers
+    self.max_waiting = max_waiting
+    self.stop_flags = context.RawArray('b', self.max_pending)
+    self.pool = ProcessPoolExecutor(self.workers, context, initializer=_init_worker, initargs=(self.stop_flags,))
+    self.free_slots = None    # asyncio.Queue, made in the running loop by the first solve
+    self.metrics = dict.fromkeys(('submitted', 'completed', 'cancelled', 'timeouts', 'rejected',
+                                  'waiting', 'pending', 'peak_waiting'), 0)
+
+  async def __aenter__(self):
+    return self
+
+  async def __aexit__(self, *exc_info):
+    self.close()
+
+  def close(self):
+    for slot in range(self.max_pending):
+      self.stop_flags[slot] = 1
+    self.pool.shutdown(wait=True, cancel_futures=True)
+
+  async def _slot(self):
+    if self.free_slots is None:
+      self.free_slots = asyncio.Queue()
+      for slot in range(self.max_pending):
+        self.free_slots.put_nowait(slot)
+    if self.free_slots.empty() and self.max_waiting is not None and self.metrics['waiting'] >= self.max_waiting:
+      self.metrics['rejected'] += 1
+      raise ServiceBusy(f"{self.metrics['waiting']} solves already waiting")
+    metrics = self.metrics
+    metrics['waiting'] += 1
+    metrics['peak_waiting'] = max(metrics['peak_waiting'], metrics['waiting'])
+    try:
+      return await self.free_slots.get()
+    finally:
+      metrics['waiting'] -= 1
+
+  async def solve(self, grid, timeout=None, search=True, puzzle_id=None):
+    # The record (see batch.solve_record) of solving clue grid *grid*. The timeout, in seconds, counts from when the
+    # solve starts in a worker. Cancelling the awaiting task stops the solve in its worker too.
+    slot = await self._slot()
+    metrics = self.metrics
+    metrics['submitted'] += 1
+    metrics['pending'] += 1
+    self.stop_flags[slot] = 0
+    future = asyncio.get_running_loop().run_in_executor(self.pool, _solve, slot, puzzle_id, grid, timeout, search)
+    try:
+      record = await asyncio.shield(future)
+    except asyncio.CancelledError:
+      self.stop_flags[slot] = 1
+      metrics['cancelled'] += 1
+      await asyncio.wait([future])    # keep the slot until the worker gives it up
+      raise
+    finally:
+      metrics['pending'] -= 1
+      self.free_slots.put_nowait(slot)
+    metrics['completed'] += 1
+    metrics['timeouts'] += record['status'] == 'timeout'
+    return record
+
+
+_default_service = None
+
+
+async def solve_async(grid, timeout=None, search=True):
+  # SolverService.solve on a service shared by the process, started on first use.
+  global _default_service
+  if _default_service is None:
+    _default_service = SolverService()
+  return await _default_service.solve(grid, timeout, search)
+
+
+async def serve_lines(service, reader, out, timeout=None):
+  # Stand-in front end: solve each JSON puzzle line from the StreamReader *reader* (a grid, or an object with 'grid'
+  # and 'id'), writing its record to the text file *out* as it finishes. Lines are solved concurrently, up to the
+  # service's limits.
+  async def handle(line):
+    puzzle = json.loads(line)
+    if not isinstance(puzzle, dict):
+      puzzle = {'grid': puzzle}
+    record = await service.solve(puzzle['grid'], timeout, puzzle_id=puzzle.get('id'))
+    out.write(json.dumps(record) + '\n')
+    out.flush()
+
+  tasks = set()
+  while line := await reader.readline():
+    if line.strip():
+      task = asyncio.create_task(handle(line))
+      tasks.add(task)
+      task.add_done_callback(tasks.discard)
+  if tasks:
+    await asyncio.wait(tasks)
+
+
+async def serve_http(service, host, port, timeout=None):
+  # Stand-in front end: POST a puzzle to /solve to get its record, GET /metrics for the service's metrics.
+  async def handle(reader, writer):
+    try:
+      method, path, _ = (await reader.readline()).decode().split(' ', 2)
+      headers = {}
+      while (line := (await reader.readline()).decode().strip()):
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+      body = await reader.readexactly(int(headers.get('content-length', 0)))
+      if method == 'GET' and path == '/metrics':
+        status, reply = 200, service.metrics
+      elif method == 'POST' and path == '/solve':
+        puzzle = json.loads(body)
+        if not isinstance(puzzle, dict):
+          puzzle = {'grid': puzzle}
+        try:
+          status, reply = 200, await service.solve(puzzle['grid'], puzzle.get('timeout', timeout), puzzle_id=puzzle.get('id'))
+        except ServiceBusy as e:
+          status, reply = 503, {'error': str(e)}
+      else:
+        status, reply = 404, {'error': f"no route for {method} {path}"}
+    except (ValueError, KeyError) as e:
+      status, reply = 400, {'error': repr(e)}
+    data = json.dumps(reply).encode()
+    writer.write(f"HTTP/1.1 {status} \r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                 f"Connection: close\r\n\r\n".encode() + data)
+    await writer.drain()
+    writer.close()
+
+  server = await asyncio.start_server(handle, host, port)
+  async with server:
+    await server.serve_forever()
+
+
+async def _stdin():
+  reader = asyncio.StreamReader()
+  await asyncio.get_running_loop().connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+  return reader
+
+
+async def main(argv=None):
+  parser = argparse.ArgumentParser(description="Solve puzzles from stdin (one JSON puzzle per line) or over HTTP.")
+  parser.add_argument('--http', metavar='PORT', type=int, help="serve POST /solve and GET /metrics on this port")
+  parser.add_argument('--host', default='127.0.0.1')
+  parser.add_argument('-w', '--workers', type=int, default=None)
+  parser.add_argument('--max-pending', type=int, default=None, help="solves in the pool at once")
+  parser.add_argument('--max-waiting', type=int, default=None, help="solves waiting for the pool before rejecting more")
+  parser.add_argument('-t', '--timeout', type=float, default=None, help="seconds per puzzle")
+  args = parser.parse_args(argv)
+
+  async with SolverService(args.workers, args.max_pending, args.max_waiting) as service:
+    if args.http is not None:
+      await serve_http(service, args.host, args.http, args.timeout)
+    else:
+      await serve_lines(service, await _stdin(), sys.stdout, args.timeout)
+      print(json.dumps(service.metrics), file=sys.stderr)
+
+
+if __name__ == '__main__':
+  asyncio.run(main())
@@ -0,0 +1,35 @@
+import asyncio
+
+import pytest
+
+from service import *
+
+
+def test_service_solves_and_times_out(GRID_1_LIST):
+    async def run():
+        async with SolverService(workers=1, max_pending=2) as service:
+            records = await asyncio.gather(*(service.solve(GRID_1_LIST, puzzle_id=str(k)) for k in range(4)),
+                                           service.solve(GRID_1_LIST, timeout=0))
+            return records, service.metrics
+    records, metrics = asyncio.run(run())
+    assert [r['status'] for r in records] == ['solved'] * 4 + ['timeout']
+    assert [r['id'] for r in records[:4]] == ['0', '1', '2', '3']
+    assert metrics['completed'] == 5 and metrics['timeouts'] == 1 and metrics['peak_waiting'] == 3
+    assert metrics['pending'] == metrics['waiting'] == 0
+
+
+def test_service_cancel_and_busy(GRID_1_LIST):
+    async def run():
+        async with SolverService(workers=1, max_pending=1, max_waiting=1) as service:
+            first = asyncio.create_task(service.solve(GRID_1_LIST))
+            second = asyncio.create_task(service.solve(GRID_1_LIST))
+            await asyncio.sleep(0)
+            with pytest.raises(ServiceBusy):
+                await service.solve(GRID_1_LIST)
+            first.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await first
+            return (await second)['status'], service.metrics
+    status, metrics = asyncio.run(run())
+    assert status == 'solved'
+    assert metrics['cancelled'] == 1 and metrics['rejected'] == 1 and metrics['completed'] == 1
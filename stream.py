@@ -0,0 +1,156 @@
+import json
+import os
+import re
+import sys
+
+WHITESPACE = re.compile(r'\s*')
+LIST_OF_PUZZLES = re.compile(r'\[\s*(\{|\[\s*\[|\])')    # an empty list, or one whose first element is an object or a grid
+DECODER = json.JSONDecoder()
+
+
+class JSONStream:
+  # Iterates over the JSON values in a text stream without reading all of it: one value per line (JSONL), values
+  # concatenated with any whitespace between them, or a list of puzzles, whose elements are yielded one at a time.
+  # Only one value at a time is kept in memory.
+
+  def __init__(self, stream, chunk_size=1 << 16):
+    self.stream = stream
+    self.chunk_size = chunk_size
+    self.buffer = ''
+    self.pos = 0
+    self.eof = False
+
+  def _fill(self):
+    # Read another chunk into the buffer, dropping what has been parsed. False at the end of the stream.
+    if self.eof:
+      return False
+    chunk = self.stream.read(self.chunk_size)
+    if not chunk:
+      self.eof = True
+      return False
+    self.buffer = self.buffer[self.pos:] + chunk
+    self.pos = 0
+    return True
+
+  def _skip(self):
+    # Move past whitespace and return the next character, or '' at the end of the stream.
+    while True:
+      self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+      if self.pos < len(self.buffer) or not self._fill():
+        return self.buffer[self.pos:self.pos+1]
+
+  def _value(self):
+    while True:
+      try:
+        value, end = DECODER.raw_decode(self.buffer, self.pos)
+      except json.JSONDecodeError:
+        if self._fill():
+          continue
+        raise
+      if end == len(self.buffer) and not isinstance(value, (list, dict, str)) and self._fill():
+        continue    # a number might go on in the next chunk
+      self.pos = end
+      return value
+
+  def _opens_list_of_puzzles(self):
+    while len(self.buffer) - self.pos < 4096 and self._fill():
+      pass
+    return LIST_OF_PUZZLES.match(self.buffer, self.pos) is not None
+
+  def __iter__(self):
+    while char := self._skip():
+      if char != '[' or not self._opens_list_of_puzzles():
+        yield self._value()
+        continue
+      self.pos += 1
+      if self._skip() == ']':
+        self.pos += 1
+        continue
+      while True:
+        self._skip()
+        yield self._value()
+        char = self._skip()
+        self.pos += 1
+        if char == ']':
+          break
+        if char != ',':
+          raise ValueError(f"expected ',' or ']' in a list of puzzles, found {char!r}")
+
+
+def read_stream(source):
+  # Yield (puzzle_id, grid) for every puzzle in *source*, a path or '-' for stdin, as it's read.
+  # A puzzle is either a grid or an object with 'grid' and optionally 'id'. The default id is "<source>:<index>".
+  read_file = sys.stdin if source == '-' else open(source, 'r')
+  try:
+    for idx, puzzle in enumerate(JSONStream(read_file)):
+      if isinstance(puzzle, dict):
+        yield puzzle.get('id', f'{source}:{idx}'), puzzle['grid']
+      else:
+        yield f'{source}:{idx}', puzzle
+  finally:
+    if read_file is not sys.stdin:
+      read_file.close()
+
+
+def written_ids(path):
+  # Ids of the records in the JSONL file *path*, which may end with a record cut off by a crash.
+  ids = set()
+  try:
+    with open(path, 'r') as read_file:
+      for line in read_file:
+        try:
+          ids.add(json.loads(line)['id'])
+        except (ValueError, KeyError, TypeError):
+          pass
+  except FileNotFoundError:
+    pass
+  return ids
+
+
+def drop_partial_line(path, chunk_size=1 << 16):
+  # Truncate the file *path* after its last newline.
+  with open(path, 'rb+') as repair:
+    end = repair.seek(0, os.SEEK_END)
+    while end > 0:
+      start = max(0, end - chunk_size)
+      repair.seek(start)
+      newline = repair.read(end - start).rfind(b'\n')
+      if newline >= 0:
+        repair.truncate(start + newline + 1)
+        return
+      end = start
+    repair.truncate(0)
+
+
+class RecordWriter:
+  # Writes records to *path* as JSONL, or to stdout for '-', flushing each one as it's written so that a crash loses at
+  # most the record being written. With *resume*, keeps the records already in the file, dropping a trailing partial
+  # one, and lists their ids in *done* so they can be skipped. With *sync*, also fsyncs after every record.
+
+  def __init__(self, path='-', resume=False, sync=False):
+    self.path = path
+    self.sync = sync
+    self.done = set()
+    if path == '-':
+      self.out = sys.stdout
+      return
+    if resume and os.path.exists(path):
+      drop_partial_line(path)
+      self.done = written_ids(path)
+    self.out = open(path, 'a' if resume else 'w')
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.close()
+
+  def write(self, record):
+    self.out.write(json.dumps(record) + '\n')
+    self.out.flush()
+    if self.sync:
+      os.fsync(self.out.fileno())
+
+  def close(self):
+    if self.out is not sys.stdout:
+      self.out.close()
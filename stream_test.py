@@ -0,0 +1,38 @@
+import io
+import json
+
+from stream import *
+
+GRID = [
+            [0, 2, 0],
+            [0, 0, 0],
+            [1, 0, 0]
+        ]
+
+
+def test_json_stream_values():
+    text = '{"id": "a", "grid": [[1]]}\n[[2, 0]]  [[3]]\n\n{"grid": [[4]]}\n[\n  [0, 5]\n]\n12345'
+    expected = [{'id': 'a', 'grid': [[1]]}, [[2, 0]], [[3]], {'grid': [[4]]}, [[0, 5]], 12345]
+    for chunk_size in (1, 3, 7, 1 << 16):
+        assert list(JSONStream(io.StringIO(text), chunk_size)) == expected, f"JSONStream failed with chunk_size {chunk_size}"
+
+
+def test_read_stream_list(tmp_path):
+    path = tmp_path / 'puzzles.json'
+    path.write_text(json.dumps([GRID, {'id': 'x', 'grid': GRID}], indent=2))
+    assert list(read_stream(str(path))) == [(f'{path}:0', GRID), ('x', GRID)], "list of puzzles not expanded"
+    path.write_text('[]\n')
+    assert list(read_stream(str(path))) == [], "empty list read as a puzzle"
+
+
+def test_record_writer_resume(tmp_path):
+    path = tmp_path / 'out.jsonl'
+    with RecordWriter(str(path)) as writer:
+        writer.write({'id': 'a'})
+        writer.write({'id': 'b'})
+    with open(path, 'a') as crashed:
+        crashed.write('{"id": "c", "so')
+    with RecordWriter(str(path), resume=True) as writer:
+        assert writer.done == {'a', 'b'}, "resume didn't find the written ids"
+        writer.write({'id': 'c'})
+    assert [json.loads(line)['id'] for line in path.read_text().splitlines()] == ['a', 'b', 'c'], "partial line not dropped"
@@ -0,0 +1,164 @@
+from itertools import chain
+try:
+  import numpy as np
+except ImportError:   # the 'numpy' backend is optional
+  np = None
+
+from gridstate import unknown, white, black
+from propagation import Propagator, SWEEPS
+
+
+def colors(state):
+  # The state's colors as a height x width int8 array sharing its buffer.
+  return np.frombuffer(state.color, dtype=np.int8).reshape(state.height, state.width)
+
+
+def dilate(masks):
+  # Boolean *masks* of shape (..., height, width) plus the orthogonal neighbors of their cells.
+  out = masks.copy()
+  out[..., 1:, :] |= masks[..., :-1, :]
+  out[..., :-1, :] |= masks[..., 1:, :]
+  out[..., :, 1:] |= masks[..., :, :-1]
+  out[..., :, :-1] |= masks[..., :, 1:]
+  return out
+
+
+def pool_breakers(state):
+  # Ids of the unknown cells that are the only non-black cell of a 2x2 square.
+  grid = colors(state)
+  is_black, is_unknown = (grid == black).astype(np.int8), grid == unknown
+  corners = ((slice(None, -1), slice(None, -1)), (slice(None, -1), slice(1, None)),
+             (slice(1, None), slice(None, -1)), (slice(1, None), slice(1, None)))
+  blacks = sum(is_black[corner] for corner in corners)   # 2x2 window sums
+  breakers = np.zeros(grid.shape, dtype=bool)
+  for corner in corners:
+    breakers[corner] |= (blacks == 3) & is_unknown[corner]
+  return np.flatnonzero(breakers).tolist()
+
+
+def reach_cells(board, rids, depth_limit=None):
+  # Ids of the cells each island in *rids* could reach within *depth_limit* steps, as sorted arrays in the order of *rids*.
+  # All the islands grow at once, one step per iteration, each in a window around it just big enough for its size budget;
+  # islands with windows of similar size are batched together. Matches Board._reach_layers, which islands that could
+  # bridge to a white region without a clue fall back to, since the cost of annexing those depends on the path taken.
+  if not rids:
+    return []
+  state = board.state
+  height, width = state.height, state.width
+  grid = colors(state)
+  is_unknown = grid == unknown
+
+  islands = [rid for rid in state.live_regions(white) if state.origin[rid] >= 0]
+  member_lists = [state.members(rid) for rid in islands]
+  sizes = np.array([len(members) for members in member_lists], dtype=np.int64)
+  members = np.fromiter(chain.from_iterable(member_lists), dtype=np.int64, count=int(sizes.sum()))
+  label = np.zeros(state.size, dtype=np.int64)   # by cell id: 1 + index of the island it belongs to, 0 if none
+  label[members] = np.repeat(np.arange(1, len(islands)+1), sizes)
+  label = label.reshape(height, width)
+  around = np.pad(label, 1)
+  around = np.sort(np.stack([around[:-2, 1:-1], around[2:, 1:-1], around[1:-1, :-2], around[1:-1, 2:]]), axis=0)
+  bordering = (around[0] > 0) + ((around[1:] != around[:-1]) & (around[1:] > 0)).sum(axis=0)   # distinct islands next to each cell
+  free = is_unknown & (bordering == 0)
+  single = is_unknown & (bordering == 1)
+  orphan_halo = dilate((grid == white) & (label == 0)) & is_unknown
+
+  number = np.searchsorted(islands, rids)   # index of each island in *islands*
+  starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+  ys, xs = members // width, members % width
+  tops, lefts = np.minimum.reduceat(ys, starts)[number], np.minimum.reduceat(xs, starts)[number]
+  spans = np.maximum(np.maximum.reduceat(ys, starts)[number] - tops, np.maximum.reduceat(xs, starts)[number] - lefts) + 1
+  budgets = np.maximum(np.frombuffer(state.size_limit, dtype=np.int32)[rids] - np.frombuffer(state.count, dtype=np.int32)[rids], 0)
+  if depth_limit is not None:
+    budgets = np.minimum(budgets, depth_limit)
+  window_sizes = 1 << np.ceil(np.log2(spans + 2*budgets + 2)).astype(np.int64)   # rounded up to powers of two
+  pad = int(window_sizes.max(initial=0))
+  padded_width = width + 2*pad
+  free, single, orphan_halo, label, is_unknown = (np.pad(a, pad).ravel() for a in (free, single, orphan_halo, label, is_unknown))
+
+  found = [None] * len(rids)
+  for size in np.unique(window_sizes).tolist():
+    batch = np.flatnonzero(window_sizes == size)
+    offsets = np.arange(size)
+    rows = tops[batch] - budgets[batch] - 1 + pad
+    columns = lefts[batch] - budgets[batch] - 1 + pad
+    windows = (rows[:, None, None] + offsets[None, :, None]) * padded_width + columns[:, None, None] + offsets[None, None, :]
+    reach = label[windows] == (number[batch] + 1)[:, None, None]
+    allowed = free[windows] | single[windows] & dilate(reach) & is_unknown[windows]
+    bridges = orphan_halo[windows]
+    budget = budgets[batch]
+    stuck = np.zeros(len(batch), dtype=bool)
+    for step in range(1, int(budget.max(initial=0)) + 1):
+      frontier = dilate(reach) & allowed & ~reach
+      frontier[(budget < step) | stuck] = False
+      bridging = (frontier & bridges).any(axis=(1, 2))
+      stuck |= bridging
+      frontier[bridging] = False
+      if not frontier.any():
+        break
+      reach |= frontier
+    cells = windows[reach]
+    cells = (cells // padded_width - pad) * width + cells % padded_width - pad    # row-major, so sorted within each island
+    for k, island_cells in zip(batch.tolist(), np.split(cells, np.cumsum(reach.sum(axis=(1, 2)))[:-1])):
+      found[k] = island_cells
+    for k in batch[stuck].tolist():
+      found[k] = np.array(sorted(set().union(*board._reach_layers(rids[k], depth_limit))), dtype=np.int64)
+  return found
+
+
+class NumpyPropagator(Propagator):
+  # Propagator for boards with the 'numpy' backend. find_unreachable recomputes the reach of every dirty island in one
+  # batched reach_cells() call and prevent_pools sweeps the board with 2x2 window sums. Changes mark the islands whose
+  # reach they touch.
+
+  def __init__(self, board):
+    super().__init__(board)
+    self.reach_cells = {}                             # island -> array of the ids of the cells it reaches
+    self.reached = np.zeros(0, dtype=np.int64)        # every island's reach_cells, concatenated
+    self.reached_by = np.zeros(0, dtype=np.int64)     # the island each entry of *reached* belongs to
+
+  def collect(self):
+    state = self.state
+    if not state.changes:
+      return
+    changes = sorted(set(state.changes))
+    state.changes.clear()
+    self.dirty_sweeps.update(SWEEPS)
+    color, cell_squares = state.color, state.geometry.cell_squares
+    for i in changes:
+      if color[i] == black:
+        self.dirty_squares.update(cell_squares[i])
+    if state.rolled_back:   # see Propagator
+      self.reset_islands()
+      return
+    touched = np.zeros(state.size, dtype=bool)
+    touched[changes] = True
+    touched = dilate(touched.reshape(state.height, state.width)).ravel()
+    for island in np.unique(self.reached_by[touched[self.reached]]).tolist():
+      self.dirty_reach[island] = 0
+      self.dirty_expand.add(island)
+
+  def find_unreachable(self):
+    state, counter = self.state, self.counters['find_unreachable']
+    counter['runs'] += 1
+    if not self.dirty_reach:
+      return
+    islands = sorted(self.dirty_reach)
+    counter['work'] += len(islands)
+    find = state.find
+    self.reach_cells.update(zip(islands, reach_cells(self.board, [find(island) for island in islands])))
+    self.dirty_reach.clear()
+    self.reached = np.concatenate([np.zeros(0, dtype=np.int64), *self.reach_cells.values()])
+    self.reached_by = np.repeat(list(self.reach_cells), [len(cells) for cells in self.reach_cells.values()])
+    unreachable = colors(state).ravel() == unknown
+    unreachable[self.reached] = False
+    cell_list = self.board.cell_list
+    self._decide('find_unreachable', black, [cell_list[i] for i in np.flatnonzero(unreachable).tolist()])
+
+  def prevent_pools(self):
+    counter = self.counters['prevent_pools']
+    counter['runs'] += 1
+    if self.dirty_squares:
+      counter['work'] += 1
+      self.dirty_squares.clear()
+      cell_list = self.board.cell_list
+      self._decide('prevent_pools', white, [cell_list[i] for i in pool_breakers(self.state)])